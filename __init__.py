@@ -4,6 +4,7 @@
 
 from trytond.pool import Pool
 from . import account
+from . import ir
 from . import move
 
 __all__ = ['register']
@@ -11,22 +12,35 @@ __all__ = ['register']
 
 def register():
     Pool.register(
+        ir.Sequence,
+        ir.SequenceStrict,
+        ir.Cron,
         account.Period,
         account.FiscalYear,
         move.Summary,
         move.SummaryPeriod,
+        move.SummaryJournal,
+        move.SummaryRun,
         move.SummaryMove,
         move.SummaryLine,
         move.Move,
+        move.SummaryBalance,
+        move.PreviewSummaryShow,
+        move.PreviewSummaryShowGroup,
+        move.PreviewSummaryShowAccount,
         move.RenumberSummaryMovesStart,
+        move.RenumberSummaryMovesPreview,
+        move.RenumberSummaryMovesPreviewLine,
         move.PrintSummaryGeneralJournalStart,
         module='account_move_summary', type_='model')
     Pool.register(
         account.RenewFiscalYear,
+        move.PreviewSummary,
         move.RenumberSummaryMoves,
         move.PrintSummaryGeneralJournal,
         module='account_move_summary', type_='wizard')
     Pool.register(
         move.SummaryGeneralJournalPDF,
         move.SummaryGeneralJournalXLS,
+        move.SummaryGeneralJournalExport,
         module='account_move_summary', type_='report')
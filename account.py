@@ -6,6 +6,7 @@ from trytond.model import fields
 from trytond.model.exceptions import ValidationError
 from trytond.pool import Pool, PoolMeta
 from trytond.pyson import Eval, Id
+from trytond.transaction import Transaction
 from trytond.i18n import gettext
 
 
@@ -21,6 +22,23 @@ class FiscalYear(metaclass=PoolMeta):
             ('company', '=', Eval('company')),
             ])
 
+    @classmethod
+    def render_summary_general_journal(cls, fiscalyears):
+        "Render the general journals of the fiscal years to cache them"
+        pool = Pool()
+        for name in [
+                'account.summary.move.general_journal_pdf',
+                'account.summary.move.general_journal_xls',
+                ]:
+            GeneralJournal = pool.get(name, type='report')
+            for fiscalyear in fiscalyears:
+                with Transaction().set_context(
+                        company=fiscalyear.company.id):
+                    GeneralJournal.execute([], {
+                            'company': fiscalyear.company.id,
+                            'fiscalyear': fiscalyear.id,
+                            })
+
 
 class Period(metaclass=PoolMeta):
     __name__ = 'account.period'
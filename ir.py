@@ -0,0 +1,101 @@
+# This file is part of the account_move_summary module for Tryton.
+# The COPYRIGHT file at the top level of this repository contains
+# the full copyright notices and license terms.
+
+from sql import Cast
+from sql.conditionals import Case
+from sql.functions import Substring
+from sql.operators import Concat
+
+from trytond import backend
+from trytond.i18n import gettext
+from trytond.ir.sequence import MissingError
+from trytond.pool import PoolMeta
+from trytond.transaction import Transaction, without_check_access
+
+
+class SequenceMixin:
+    __slots__ = ()
+
+    @without_check_access
+    def get_many(self, count):
+        '''
+        Return the next count sequence values reserved at once
+        '''
+        cls = self.__class__
+        if count <= 0:
+            return []
+        try:
+            sequence = cls(self.id)
+        except TypeError:
+            raise MissingError(gettext('ir.msg_sequence_missing'))
+        if sequence.type != 'incremental':
+            return [sequence.get() for _ in range(count)]
+        if cls._strict:
+            self.lock()
+
+        increment = sequence.number_increment
+        if backend.Database.has_sequence() and not cls._strict:
+            cursor = Transaction().connection.cursor()
+            cursor.execute('SELECT nextval(\'"%s"\') '
+                'FROM generate_series(1, %%s)'
+                % sequence._sql_sequence_name, (count,))
+            numbers = sorted(n for n, in cursor)
+            # clean cache
+            Transaction().counter += 1
+            sequence._local_cache.pop(sequence.id, None)
+        else:
+            number_next = sequence.number_next_internal
+            numbers = range(
+                number_next, number_next + count * increment, increment)
+            cls.write([sequence], {
+                    'number_next_internal': number_next + count * increment,
+                    })
+        return [sequence.format_number(n) for n in numbers]
+
+    def format_number(self, number):
+        '''
+        Return the value of the incremental sequence for the number
+        '''
+        cls = self.__class__
+        return '%s%s%s' % (
+            cls._process(self.prefix),
+            f'{number:0>{self.padding}d}',
+            cls._process(self.suffix),
+            )
+
+    def format_number_sql(self, number):
+        '''
+        Return the SQL expression of the value of the incremental sequence for
+        the number column
+        '''
+        cls = self.__class__
+        value = Cast(number, 'VARCHAR')
+        if self.padding:
+            # Prepend the zeros by adding a power of ten
+            power = 10 ** self.padding
+            value = Case(
+                (number < power,
+                    Substring(Cast(number + power, 'VARCHAR'), 2)),
+                else_=value)
+        return Concat(Concat(
+                cls._process(self.prefix), value), cls._process(self.suffix))
+
+
+class Sequence(SequenceMixin, metaclass=PoolMeta):
+    __name__ = 'ir.sequence'
+
+
+class SequenceStrict(SequenceMixin, metaclass=PoolMeta):
+    __name__ = 'ir.sequence.strict'
+
+
+class Cron(metaclass=PoolMeta):
+    __name__ = 'ir.cron'
+
+    @classmethod
+    def __setup__(cls):
+        super().__setup__()
+        cls.method.selection.append(
+            ('account.summary.balance|compact_balances',
+                "Compact Summary Balances"))
@@ -1,24 +1,49 @@
 # This file is part of the account_move_summary module for Tryton.
 # The COPYRIGHT file at the top level of this repository contains
 # the full copyright notices and license terms.
+import codecs
+import csv
+import datetime as dt
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from collections import defaultdict, namedtuple
 from decimal import Decimal
-from functools import reduce
-from itertools import groupby
-from operator import itemgetter
-from sql.aggregate import Sum
-from sql.functions import CharLength
-
-from trytond.model import ModelView, ModelSQL, Workflow, fields
+from functools import partial, reduce
+from io import BytesIO
+from sql import Cast, Column, Flavor, Literal, Null, Union, Window
+from sql.aggregate import Count, Max, Min, Sum
+from sql.conditionals import Case, Coalesce
+from sql.functions import (
+    Abs, CharLength, CurrentTimestamp, Extract, Function, RowNumber)
+from sql.operators import Concat
+
+from trytond import backend
+from trytond.config import config
+from trytond.model import (
+    ModelView, ModelSQL, Workflow, Index, dualmethod, fields)
 from trytond.model.exceptions import AccessError
 from trytond.modules.currency.fields import Monetary
-from trytond.wizard import Wizard, StateView, StateAction, StateReport, Button
+from trytond.wizard import (
+    Wizard, StateView, StateAction, StateReport, StateTransition, Button)
 from trytond.report import Report
 from trytond.pool import Pool, PoolMeta
 from trytond.pyson import PYSONEncoder, Eval, Bool, If
-from trytond.transaction import Transaction
+from trytond.rpc import RPC
+from trytond.transaction import Transaction, without_check_access
 from trytond.exceptions import UserWarning
 from trytond.i18n import gettext
-from trytond.tools import reduce_ids, grouped_slice
+from trytond.tools import reduce_ids, grouped_slice, slugify
+from trytond.worker import initializer
+
+logger = logging.getLogger(__name__)
 
 _MOVE_STATES = {
     'readonly': Eval('state') == 'posted',
@@ -28,6 +53,76 @@ _LINE_STATES = {
     }
 
 
+def clear_cache(Model):
+    "Clear the cached records of the model updated with SQL"
+    transaction = Transaction()
+    transaction.counter += 1
+    for cache in transaction.cache.values():
+        cache.pop(Model.__name__, None)
+
+
+@contextmanager
+def server_cursor(name, size=1000):
+    "Return a cursor which fetches the rows by batch of size"
+    connection = Transaction().connection
+    if backend.name == 'postgresql':
+        cursor = connection.cursor(name)
+        cursor.itersize = size
+    else:
+        cursor = connection.cursor()
+    cursor.arraysize = size
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+_report_pools = {}
+_report_pools_lock = threading.Lock()
+
+
+def _get_report_pool(database_name, processes):
+    """Return the pool of processes which render the reports of the database
+
+    The pool is started once by process and kept for the next reports, so the
+    workers load the pool of the database only once."""
+    key = (os.getpid(), database_name)
+    with _report_pools_lock:
+        mpool = _report_pools.get(key)
+        if mpool is None:
+            options = {s: dict(config.items(s, raw=True))
+                for s in config.sections()}
+            mp_context = multiprocessing.get_context('spawn')
+            mpool = _report_pools[key] = mp_context.Pool(
+                processes, _init_report_worker, (database_name, options))
+    return mpool
+
+
+def _init_report_worker(database_name, options):
+    "Load the configuration and the pool of the database in the process"
+    for section, values in options.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for option, value in values.items():
+            config.set(section, option, value)
+    Flavor.set(backend.Database.flavor)
+    initializer([database_name], worker=False)
+
+
+def _execute_report_period(
+        database_name, user, context, name, period, header, data, action_id):
+    "Render the period of the report in its own transaction"
+    with Transaction().start(
+            database_name, user, readonly=True, context=context):
+        Report = Pool().get(name, type='report')
+        return Report._execute_period(period, header, data, action_id)
+
+
+class SplitPart(Function):
+    __slots__ = ()
+    _function = 'SPLIT_PART'
+
+
 class Summary(Workflow, ModelSQL, ModelView):
     'Summary'
     __name__ = 'account.summary'
@@ -47,11 +142,50 @@ class Summary(Workflow, ModelSQL, ModelView):
         'summary', 'period', 'Periods', required=True,
         domain=[('company', '=', Eval('company', -1))],
         states=_states)
+    group_origin = fields.Boolean('Group by Origin Model', states=_states,
+        help="Summarize apart the moves of each grouped origin model.")
+    group_single_moves = fields.Boolean('Group Single Moves', states=_states,
+        help="Summarize together by journal the moves without grouped origin "
+        "instead of one summary move for each.")
+    group_party = fields.Boolean('Group by Party', states=_states,
+        help="Summarize apart the moves of each party.")
+    group_date = fields.Selection([
+            ('period', 'Period'),
+            ('week', 'Week'),
+            ('day', 'Day'),
+            ], 'Group by Date', required=True, states=_states,
+        help="Summarize apart the moves of each period, week or day.")
+    journals = fields.Many2Many('account.summary.journal',
+        'summary', 'journal', 'Journals', states=_states,
+        context={'company': Eval('company', -1)}, depends={'company'},
+        help="Limit the summary to the moves of these journals.\n"
+        "Leave empty for all journals.")
     state = fields.Selection([
         ('draft', 'Draft'),
+        ('running', 'Running'),
         ('calculated', 'Calculated'),
+        ('posting', 'Posting'),
         ('posted', 'Posted'),
         ], 'State', required=True, readonly=True)
+    tasks = fields.Integer('Tasks', readonly=True,
+        states={
+            'invisible': ~Eval('state').in_(['running', 'posting']),
+            },
+        help="The number of tasks computing the summary in parallel "
+        "or posting it by batch.")
+    tasks_done = fields.Integer('Tasks Done', readonly=True,
+        states={
+            'invisible': ~Eval('state').in_(['running', 'posting']),
+            })
+    moves_done = fields.Integer('Moves Done', readonly=True,
+        states={
+            'invisible': ~Eval('state').in_(['running', 'posting']),
+            },
+        help="The number of moves summarized by the tasks done "
+        "or of summary moves posted.")
+    runs = fields.One2Many('account.summary.run', 'summary', 'Runs',
+        readonly=True,
+        help="The metrics of the computations and postings of the summary.")
 
     del _states
 
@@ -62,8 +196,12 @@ class Summary(Workflow, ModelSQL, ModelView):
         cls._order.insert(1, ('id', 'DESC'))
         cls._transitions |= set((
             ('draft', 'calculated'),
+            ('draft', 'running'),
+            ('running', 'calculated'),
             ('calculated', 'draft'),
             ('calculated', 'posted'),
+            ('calculated', 'posting'),
+            ('posting', 'posted'),
             ))
         cls._buttons.update({
             'draft': {
@@ -74,11 +212,22 @@ class Summary(Workflow, ModelSQL, ModelView):
                 'invisible': Eval('state') != 'draft',
                 'depends': ['state'],
                 },
+            'refresh': {
+                'invisible': Eval('state') != 'calculated',
+                'depends': ['state'],
+                },
             'post': {
                 'invisible': Eval('state') != 'calculated',
                 'depends': ['state'],
                 },
+            'preview': {
+                'invisible': ~Eval('state').in_(['draft', 'calculated']),
+                'depends': ['state'],
+                },
             })
+        cls.__rpc__.update({
+                'get_preview': RPC(readonly=True, instantiate=0),
+                })
 
     @staticmethod
     def default_summary_type():
@@ -88,6 +237,22 @@ class Summary(Workflow, ModelSQL, ModelView):
     def default_state():
         return 'draft'
 
+    @staticmethod
+    def default_group_origin():
+        return True
+
+    @staticmethod
+    def default_group_single_moves():
+        return False
+
+    @staticmethod
+    def default_group_party():
+        return False
+
+    @staticmethod
+    def default_group_date():
+        return 'period'
+
     @staticmethod
     def default_company():
         return Transaction().context.get('company')
@@ -97,152 +262,925 @@ class Summary(Workflow, ModelSQL, ModelView):
         Date = Pool().get('ir.date')
         return Date.today()
 
+    @classmethod
+    def copy(cls, summaries, default=None):
+        if default is None:
+            default = {}
+        else:
+            default = default.copy()
+        default.setdefault('runs', None)
+        default.setdefault('tasks', None)
+        default.setdefault('tasks_done', None)
+        default.setdefault('moves_done', None)
+        return super().copy(summaries, default=default)
+
     @classmethod
     @ModelView.button
     @Workflow.transition('draft')
     def draft(cls, summaries):
-        for summary in summaries:
-            summary._draft_summary()
+        cls._draft_summaries(summaries)
 
     def _draft_summary(self):
-        SummaryMove = Pool().get('account.summary.move')
-        moves = SummaryMove.search([('summary', '=', self.id)])
-        SummaryMove.delete([m for m in moves])
+        self._draft_summaries([self])
+
+    @classmethod
+    def _draft_summaries(cls, summaries):
+        "Unlink and delete the summary moves of the summaries in bulk"
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryMove = pool.get('account.summary.move')
+        SummaryMoveLine = pool.get('account.summary.move.line')
+        SummaryBalance = pool.get('account.summary.balance')
+        move = Move.__table__()
+        summary_move = SummaryMove.__table__()
+        summary_line = SummaryMoveLine.__table__()
+        cursor = Transaction().connection.cursor()
+
+        for sub_ids in grouped_slice([s.id for s in summaries]):
+            where = reduce_ids(summary_move.summary, sub_ids)
+            summary_moves = summary_move.select(
+                summary_move.id, where=where)
+            SummaryBalance._insert_moves(
+                move, move.summary_move.in_(summary_moves))
+            cursor.execute(*move.update(
+                    [move.summary_move], [Null],
+                    where=move.summary_move.in_(summary_moves)))
+            cursor.execute(*summary_line.delete(
+                    where=summary_line.move.in_(summary_moves)))
+            cursor.execute(*summary_move.delete(where=where))
+        clear_cache(Move)
+        clear_cache(SummaryMoveLine)
+        clear_cache(SummaryMove)
+        for summary in summaries:
+            summary.tasks = summary.tasks_done = summary.moves_done = None
+        cls.save(summaries)
 
     @classmethod
     @ModelView.button
     @Workflow.transition('calculated')
     def compute(cls, summaries):
+        if config.getboolean(
+                'account_move_summary', 'compute_parallel', default=False):
+            cls.run(summaries)
+            return
+        for summary in summaries:
+            with summary._record_run('compute') as run:
+                summary._validate_summary()
+                summary._compute_summary(run)
+
+    @classmethod
+    @Workflow.transition('running')
+    def run(cls, summaries):
+        "Dispatch the computation of the summaries to the queue workers"
         for summary in summaries:
             summary._validate_summary()
-            summary._compute_summary()
+            parts = summary._get_compute_parts()
+            summary.tasks = len(parts)
+            summary.tasks_done = 0
+            summary.moves_done = 0
+            with Transaction().set_context(queue_name='account_summary'):
+                for period, journals in parts:
+                    cls.__queue__.compute_part([summary], period, journals)
+        cls.save(summaries)
+
+    def _get_compute_parts(self):
+        "Return the list of period and journals computed by each task"
+        pool = Pool()
+        SummaryBalance = pool.get('account.summary.balance')
+        balance = SummaryBalance.__table__()
+        cursor = Transaction().connection.cursor()
+
+        split_journal = config.getboolean(
+            'account_move_summary', 'compute_parallel_journal', default=False)
+        parts = []
+        for period in self.periods:
+            journals = []
+            if split_journal:
+                where = ((balance.company == self.company.id)
+                    & (balance.period == period.id))
+                if self.journals:
+                    where &= balance.journal.in_(
+                        [j.id for j in self.journals])
+                cursor.execute(*balance.select(balance.journal,
+                        where=where,
+                        group_by=[balance.journal],
+                        having=Sum(balance.moves) != 0))
+                journals = [j for j, in cursor]
+            if journals:
+                parts.extend((period.id, [j]) for j in journals)
+            else:
+                parts.append((period.id, None))
+        return parts
+
+    @classmethod
+    def compute_part(cls, summaries, period, journals=None):
+        "Compute the moves of the period and journals of running summaries"
+        pool = Pool()
+        Period = pool.get('account.period')
+
+        period = Period(period)
+        moves = []
+        with Transaction().set_context(summary_journals=journals):
+            for summary in summaries:
+                if summary.state != 'running':
+                    moves.append(0)
+                    continue
+                with summary._record_run('compute') as run:
+                    summary._compute_summary_period(period, run)
+                moves.append(run.moves or 0)
+        with Transaction().set_context(queue_name='account_summary'):
+            cls.__queue__.finish_part(summaries, moves)
+
+    @classmethod
+    def finish_part(cls, summaries, moves=None):
+        "Count a task done and set the summary calculated after the last one"
+        # The counts are updated by a separated task to retry only this update
+        # when the tasks of a summary finish concurrently
+        if moves is None:
+            moves = [0] * len(summaries)
+        to_calculate = []
+        for summary, count in zip(summaries, moves):
+            if summary.state != 'running':
+                continue
+            summary.tasks_done = (summary.tasks_done or 0) + 1
+            summary.moves_done = (summary.moves_done or 0) + count
+            if summary.tasks_done >= summary.tasks:
+                to_calculate.append(summary)
+        cls.save(summaries)
+        for summary in to_calculate:
+            summary._validate_summary_moves()
+        cls.calculate(to_calculate)
+
+    @classmethod
+    @Workflow.transition('calculated')
+    def calculate(cls, summaries):
+        pass
+
+    @classmethod
+    @ModelView.button
+    def refresh(cls, summaries):
+        "Summarize the moves posted since the summaries were calculated"
+        for summary in summaries:
+            if summary.state != 'calculated':
+                continue
+            with summary._record_run('refresh') as run:
+                summary._validate_summary()
+                summary._compute_summary(run)
+
+    @classmethod
+    @ModelView.button_action('account_move_summary.wizard_summary_preview')
+    def preview(cls, summaries):
+        pass
+
+    @classmethod
+    def get_preview(cls, summaries):
+        "Return the preview of the computation of the summaries by id"
+        return {s.id: s._preview_summary() for s in summaries}
+
+    @contextmanager
+    def _record_run(self, operation):
+        "Yield a run which stores the metrics of the operation"
+        pool = Pool()
+        Run = pool.get('account.summary.run')
+
+        run = Run.begin(self, operation)
+        start = time.perf_counter()
+        with run.count_queries():
+            yield run
+        run.finish(time.perf_counter() - start)
+        run.save()
 
     def _validate_summary(self):
         pass
 
-    def _compute_summary(self):
+    def _compute_summary(self, run=None):
+        pool = Pool()
+        Run = pool.get('account.summary.run')
+
+        if run is None:
+            run = Run()
+        for period in self.periods:
+            self._compute_summary_period(period, run)
+        with run.phase('validate'):
+            self._validate_summary_moves()
+
+    def _validate_summary_moves(self):
+        "Validate all the draft summary moves of the summary at once"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+
+        SummaryMove._validate_move_query(
+            summary_move.select(summary_move.id,
+                where=(summary_move.summary == self.id)
+                & (summary_move.state == 'draft')),
+            self.company.currency)
+
+    def _compute_summary_period(self, period, run=None):
         pool = Pool()
-        Move = pool.get('account.move')
         SummaryMove = pool.get('account.summary.move')
         SummaryMoveLine = pool.get('account.summary.move.line')
-        Model = pool.get('ir.model')
+        SummaryBalance = pool.get('account.summary.balance')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        Run = pool.get('account.summary.run')
+
+        chunk = config.getint(
+            'account_move_summary', 'compute_chunk', default=10000)
+        if run is None:
+            run = Run()
+
+        # Only the amounts of each group and account are kept in memory
+        accum = {}
+        with run.phase('search'):
+            summary_moves = self._get_summary_period_moves(period)
+        existing = set(summary_moves.values())
+        journals = {}
+        for rows, link in self._get_summary_chunks(period, chunk, run):
+            to_create = {}
+            with run.phase('aggregate'):
+                for (origin, journal_id, move_id, key, account_id, debit,
+                        credit, description, line_description, count, date,
+                        party) in rows:
+                    group = (journal_id, key)
+                    if (group not in summary_moves
+                            and group not in to_create):
+                        if journal_id not in journals:
+                            journals[journal_id] = Journal(journal_id)
+                        journal = journals[journal_id]
+                        if not move_id:
+                            description = self._get_summary_group_description(
+                                journal, origin, party)
+                        to_create[group] = SummaryMove(
+                            company=self.company,
+                            journal=journal,
+                            period=period,
+                            date=self._get_summary_group_date(period, date),
+                            description=description,
+                            summary=self,
+                            group_key=key,
+                            )
+                    # SQLite uses float for SUM
+                    if not isinstance(debit, Decimal):
+                        debit = Decimal(str(debit))
+                    if not isinstance(credit, Decimal):
+                        credit = Decimal(str(credit))
+                    value = accum.setdefault((group, account_id), {
+                            'debit': Decimal('0.0'),
+                            'credit': Decimal('0.0'),
+                            'description': (
+                                line_description if move_id else None),
+                            })
+                    value['debit'] += debit
+                    value['credit'] += credit
+                    run.add('lines', count)
+            with run.phase('create'), Transaction().set_context(
+                    _defer_validate_move=True):
+                SummaryMove.save(list(to_create.values()))
+            run.add('summary_moves', len(to_create))
+            summary_moves.update(
+                (g, m.id) for g, m in to_create.items())
+            with run.phase('link'):
+                run.add('moves', link())
+
+        accounts = {a.id: a for a in Account.browse(list({
+                        a for _, a in accum}))}
+        # Merge the amounts into the lines of the already computed moves
+        touched = {summary_moves[g] for g, _ in accum}
+        lines = {}
+        with run.phase('search'):
+            for line in SummaryMoveLine.search([
+                        ('move', 'in', list(touched & existing)),
+                        ]):
+                lines[(line.move.id, line.account.id)] = line
+        to_create, to_write = [], []
+        for (group, account_id), value in accum.items():
+            line = lines.get((summary_moves[group], account_id))
+            if line:
+                value['debit'] += line.debit
+                value['credit'] += line.credit
+            # Force debit or credit to zero
+            if value['debit'] != Decimal('0.0') and \
+                    value['credit'] != Decimal('0.0'):
+                if value['debit'] > value['credit']:
+                    value['debit'] -= value['credit']
+                    value['credit'] = Decimal('0.0')
+                else:
+                    value['credit'] -= value['debit']
+                    value['debit'] = Decimal('0.0')
+            if line:
+                to_write.extend(([line], {
+                            'debit': value['debit'],
+                            'credit': value['credit'],
+                            }))
+                continue
+            description = value['description']
+            if description is None:
+                description = accounts[account_id].name
+            to_create.append({
+                    'move': summary_moves[group],
+                    'account': account_id,
+                    'debit': value['debit'],
+                    'credit': value['credit'],
+                    'description': description,
+                    })
+        with run.phase('create'):
+            if to_write:
+                SummaryMoveLine.write(*to_write)
+            SummaryMoveLine.create(to_create)
+        run.add('summary_lines', len(to_create))
+        with run.phase('link'):
+            SummaryBalance.compact(
+                self.company, period, self._get_summary_journals())
+
+    def _preview_summary(self):
+        """Return the numbers of moves, summary moves and summary lines and the
+        totals by group and account which the computation of the moves not yet
+        summarized would produce without writing them"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryMoveLine = pool.get('account.summary.move.line')
+        Journal = pool.get('account.journal')
+        move = Move.__table__()
+        cursor = Transaction().connection.cursor()
 
+        chunk = config.getint(
+            'account_move_summary', 'compute_chunk', default=10000)
+        moves = 0
+        groups, accum = {}, {}
+        existing_moves, existing_lines = set(), set()
         for period in self.periods:
-            accum = {}
-            moves = Move.search([
-                ('company', '=', self.company.id),
-                ('period', '=', period.id),
-                ('state', '=', 'posted'),
-                ('summary_move', '=', None),
-                ])
-            for move in moves:
-                type_ = None
-                single_move = False
-                origin = str(move.origin).split(',')[0] \
-                    if move.origin else None
-
-                if origin:
-                    if self.summary_type == 'purchases_and_sales' \
-                            and origin != 'account.invoice':
-                        single_move = True
-                    else:
-                        type_ = '%s_%s' % (
-                            origin.replace('.', '_'), str(move.journal.id))
-                        if type_ not in accum:
-                            accum[type_] = {
-                                'moves': [],
-                                'model': origin,
-                                'journal': move.journal
-                                }
-                else:
-                    single_move = True
-
-                if single_move:
-                    type_ = 'single_move_%s' % str(move.id)
-                    accum[type_] = {
-                        'moves': [],
-                        'journal': move.journal,
-                        'description': move.description
-                        }
-                accum[type_]['moves'].append(move.id)
-                for l in move.lines:
-                    data = accum[type_].get(l.account.id, {
-                        'debit': Decimal('0.0'),
-                        'credit': Decimal('0.0'),
-                        'description': None
-                        })
-                    data['debit'] += l.debit
-                    data['credit'] += l.credit
-                    if type_[0:11] == 'single_move':
-                        data['description'] = l.description
-                    else:
-                        data['description'] = l.account.name
-                    accum[type_][l.account.id] = data
+            cursor.execute(*move.select(Count(Literal('*')),
+                    where=self._get_summary_move_where(move, period)))
+            period_moves, = cursor.fetchone()
+            moves += period_moves
+            summary_moves = {
+                i: (period.id, j, k)
+                for (j, k), i in self._get_summary_period_moves(
+                    period).items()}
+            existing_moves.update(summary_moves.values())
+            existing_lines.update(
+                (summary_moves[line.move.id], line.account.id)
+                for line in SummaryMoveLine.search([
+                        ('move', 'in', list(summary_moves)),
+                        ]))
+            start = 0
+            while True:
+                ids = self._get_summary_chunk(period, start, chunk)
+                if not ids:
+                    break
+                for (origin, journal_id, move_id, key, account_id, debit,
+                        credit, description, _, count, _, party) in (
+                            self._get_summary_lines(period, ids)):
+                    group = (period.id, journal_id, key)
+                    if group not in groups:
+                        if not move_id:
+                            description = self._get_summary_group_description(
+                                Journal(journal_id), origin, party)
+                        groups[group] = {
+                            'period': period.id,
+                            'journal': journal_id,
+                            'description': description,
+                            'lines': 0,
+                            }
+                    groups[group]['lines'] += count
+                    # SQLite uses float for SUM
+                    if not isinstance(debit, Decimal):
+                        debit = Decimal(str(debit))
+                    if not isinstance(credit, Decimal):
+                        credit = Decimal(str(credit))
+                    value = accum.setdefault(
+                        (group, account_id), [Decimal(0), Decimal(0)])
+                    value[0] += debit
+                    value[1] += credit
+                start = ids[-1]
+
+        # Force debit or credit to zero like the summary lines
+        totals = {'groups': groups, 'accounts': {}}
+        for (group, account_id), (debit, credit) in accum.items():
+            balance = debit - credit
+            debit = max(balance, Decimal(0))
+            credit = max(-balance, Decimal(0))
+            for name, key in [('groups', group), ('accounts', account_id)]:
+                value = totals[name].setdefault(key, {})
+                value['debit'] = value.get('debit', Decimal(0)) + debit
+                value['credit'] = value.get('credit', Decimal(0)) + credit
+        for account_id, value in totals['accounts'].items():
+            value['account'] = account_id
+        return {
+            'moves': moves,
+            'summary_moves': len(set(groups) - existing_moves),
+            'summary_lines': len(set(accum) - existing_lines),
+            'groups': list(groups.values()),
+            'accounts': sorted(
+                totals['accounts'].values(), key=lambda v: v['account']),
+            }
 
-            for keys, values in accum.items():
-                if not values:
-                    continue
-                summary_move_lines = []
-                for account_id, value in values.items():
-                    # Ignore move data
-                    if account_id in [
-                            'moves', 'model', 'journal', 'description']:
-                        continue
-                    # Force debit or credit to zero
-                    if value['debit'] != Decimal('0.0') and \
-                            value['credit'] != Decimal('0.0'):
-                        if value['debit'] > value['credit']:
-                            value['debit'] -= value['credit']
-                            value['credit'] = Decimal('0.0')
-                        else:
-                            value['credit'] -= value['debit']
-                            value['debit'] = Decimal('0.0')
-                    summary_move_lines.append(SummaryMoveLine(
-                        account=account_id,
-                        debit=value['debit'],
-                        credit=value['credit'],
-                        description=value['description'],
-                        date=period.end_date,
-                        ))
-
-                description = None
-                origin_name = None
-                if 'model' in values:
-                    origin_name = Model.get_name(values['model'])
-                    description = '%s - %s' % (
-                        origin_name, values['journal'].name)
-                elif 'description' in values:
-                    description = values['description']
-                summary_move = SummaryMove()
-                summary_move.journal = values['journal']
-                summary_move.description = description
-                summary_move.period = period
-                summary_move.company = self.company
-                summary_move.summary = self
-                summary_move.lines = summary_move_lines
-                summary_move.save()
-
-                summarized_moves = Move.browse(values['moves'])
-                Move.write(summarized_moves, {
-                    'summary_move': summary_move.id})
+    def _get_summary_period_moves(self, period):
+        "Return the draft summary moves of the period by journal and key"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        cursor.execute(*summary_move.select(
+                summary_move.journal, summary_move.group_key,
+                summary_move.id,
+                where=(summary_move.summary == self.id)
+                & (summary_move.period == period.id)
+                & (summary_move.state == 'draft')))
+        return {(j, k): i for j, k, i in cursor}
+
+    def _get_summary_group_columns(self, move):
+        """Return the origin, single move and key SQL columns which with the
+        journal group the moves"""
+        origin = SplitPart(move.origin, ',', 1)
+        models = self._get_summary_grouped_origins()
+        if models:
+            grouped = origin.in_(models)
+        else:
+            grouped = Literal(False)
+        origin = Case((grouped, origin), else_=Null)
+        if self.group_single_moves:
+            single_move = Literal(Null)
+        else:
+            single_move = Case((grouped, Null), else_=move.id)
+        if self.group_origin:
+            key = origin
+        else:
+            key = Case((grouped, ''), else_=Null)
+        if self.group_single_moves:
+            key = Coalesce(key, '')
+        else:
+            key = Coalesce(key,
+                Concat('account.move,', Cast(single_move, 'VARCHAR')))
+
+        if self.group_date == 'day':
+            key = Concat(Concat(key, '@'), Cast(move.date, 'VARCHAR'))
+        elif self.group_date == 'week':
+            year, month, week = [Cast(Extract(f, move.date), 'INTEGER')
+                for f in ['YEAR', 'MONTH', 'WEEK']]
+            # The ISO year of the first and last days of the year
+            year = Case(
+                ((week == 1) & (month == 12), year + 1),
+                ((week >= 52) & (month == 1), year - 1),
+                else_=year)
+            key = Concat(Concat(Concat(Concat(key, '@'), year), '-W'), week)
+        party = self._get_summary_group_party(move)
+        if party:
+            key = Concat(Concat(key, '#'), Coalesce(party, 0))
+        return origin, single_move, key
+
+    def _get_summary_group_party(self, move):
+        """Return the party SQL column which groups the moves or None
+
+        The party of a move is the party of its lines, as the lines of a move
+        have usually at most one party."""
+        pool = Pool()
+        MoveLine = pool.get('account.move.line')
+        line = MoveLine.__table__()
+
+        if self.group_party:
+            return line.select(Max(line.party), where=line.move == move.id)
+
+    def _get_summary_group_description(self, journal, origin, party):
+        "Return the description of the summary move of a group"
+        pool = Pool()
+        Model = pool.get('ir.model')
+        Party = pool.get('party.party')
+
+        names = []
+        if origin and self.group_origin:
+            names.append(Model.get_name(origin))
+        names.append(journal.name)
+        if party:
+            names.append(Party(party).rec_name)
+        return ' - '.join(names)
+
+    def _get_summary_group_date(self, period, date):
+        "Return the date of the summary move of a group of moves of the date"
+        # SQLite returns the dates of aggregation as string
+        if isinstance(date, str):
+            date = dt.date.fromisoformat(date)
+        if self.group_date == 'day' and date:
+            return date
+        elif self.group_date == 'week' and date:
+            return min(
+                date + dt.timedelta(days=6 - date.weekday()), period.end_date)
+        return period.end_date
+
+    def _use_summary_balances(self):
+        "Return if the groups can be read from the balances"
+        return (self.group_origin and self.group_date == 'period'
+            and not self.group_party)
+
+    def _get_summary_grouped_origins(self):
+        "Return the origin models of which the moves are grouped"
+        pool = Pool()
+        Move = pool.get('account.move')
+
+        # Like the Reference field, ignore origins of unknown model
+        models = [m for m, _ in Move.get_origin() if m]
+        if self.summary_type == 'purchases_and_sales':
+            models = [m for m in models if m == 'account.invoice']
+        return models
+
+    def _get_summary_journals(self):
+        "Return the ids of the journals to summarize or None for all"
+        context = Transaction().context
+        # The journals of a task of the parallel computation
+        if context.get('summary_journals'):
+            return context['summary_journals']
+        if self.journals:
+            return [j.id for j in self.journals]
+
+    def _get_summary_move_where(self, move, period):
+        where = ((move.company == self.company.id)
+            & (move.period == period.id)
+            & (move.state == 'posted')
+            & (move.summary_move == Null))
+        journals = self._get_summary_journals()
+        if journals:
+            where &= move.journal.in_(journals)
+        return where
+
+    def _get_summary_chunk(self, period, start, size, lock=False):
+        """Return the ids of the next chunk of size moves after start
+
+        With lock, the moves are claimed until the end of the transaction and
+        the moves claimed by other transactions are skipped if the database
+        supports it."""
+        pool = Pool()
+        Move = pool.get('account.move')
+        move = Move.__table__()
+        transaction = Transaction()
+        database = transaction.database
+        cursor = transaction.connection.cursor()
+
+        query = move.select(move.id,
+            where=self._get_summary_move_where(move, period)
+            & (move.id > start),
+            order_by=[move.id.asc],
+            limit=size)
+        if lock and database.has_select_for():
+            For = database.get_select_for_skip_locked()
+            query.for_ = For('UPDATE')
+        cursor.execute(*query)
+        return [i for i, in cursor]
+
+    def _get_summary_chunks(self, period, size, run):
+        """Yield the lines and the link function of the chunks of moves of the
+        period
+
+        When the grouping allows it, the first chunk is the moves of the
+        grouped origins which is read from their balances so the next chunks
+        contain only single moves."""
+        if self._use_summary_balances():
+            with run.phase('search'):
+                checked = self._check_summary_balances(period)
+            # Otherwise the chunks contain also the moves of grouped origins
+            if checked:
+                yield (self._get_summary_balance_lines(period),
+                    partial(self._link_summary_group_moves, period))
+        start = 0
+        while True:
+            with run.phase('search'):
+                ids = self._get_summary_chunk(period, start, size, lock=True)
+            if not ids:
+                break
+            yield (self._get_summary_lines(period, ids),
+                partial(self._link_summary_moves, period, ids))
+            start = ids[-1]
+
+    def _get_summary_balance_where(self, balance, period):
+        where = ((balance.company == self.company.id)
+            & (balance.period == period.id)
+            & balance.origin.in_(self._get_summary_grouped_origins()))
+        journals = self._get_summary_journals()
+        if journals:
+            where &= balance.journal.in_(journals)
+        return where
+
+    def _get_summary_group_claim(self, period):
+        """Return the query of the ids of the moves of the grouped origins to
+        summarize
+
+        The moves are claimed until the end of the transaction and the moves
+        claimed by other transactions are skipped if the database supports
+        it."""
+        pool = Pool()
+        Move = pool.get('account.move')
+        move = Move.__table__()
+        database = Transaction().database
+
+        origin, _, _ = self._get_summary_group_columns(move)
+        query = move.select(move.id,
+            where=self._get_summary_move_where(move, period)
+            & (origin != Null))
+        if database.has_select_for():
+            For = database.get_select_for_skip_locked()
+            query.for_ = For('UPDATE')
+        return query
+
+    def _check_summary_balances(self, period):
+        """Return if the balances of the grouped origins match the lines of
+        the claimed moves to summarize"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        MoveLine = pool.get('account.move.line')
+        SummaryBalance = pool.get('account.summary.balance')
+        move = Move.__table__()
+        line = MoveLine.__table__()
+        balance = SummaryBalance.__table__()
+        cursor = Transaction().connection.cursor()
+
+        if not self._get_summary_grouped_origins():
+            return True
+        currency = self.company.currency
+
+        def totals():
+            lines, debit, credit = cursor.fetchone()
+            # SQLite uses float for SUM
+            return (lines or 0,
+                currency.round(Decimal(str(debit or 0))),
+                currency.round(Decimal(str(credit or 0))))
+        cursor.execute(*balance.select(
+                Sum(balance.lines), Sum(balance.debit), Sum(balance.credit),
+                where=self._get_summary_balance_where(balance, period)))
+        expected = totals()
+        cursor.execute(*line.select(
+                Count(line.id), Sum(line.debit), Sum(line.credit),
+                where=line.move.in_(self._get_summary_group_claim(period))))
+        if totals() == expected:
+            return True
+        # Some moves may be claimed by another computation
+        origin, _, _ = self._get_summary_group_columns(move)
+        cursor.execute(*move.join(line, condition=line.move == move.id
+                ).select(
+                Count(line.id), Sum(line.debit), Sum(line.credit),
+                where=self._get_summary_move_where(move, period)
+                & (origin != Null)))
+        if totals() != expected:
+            logger.warning(
+                "The summary balances of period %s do not match its moves, "
+                "run account.summary.balance.rebuild", period.id)
+        return False
+
+    def _get_summary_balance_lines(self, period):
+        """Yield the lines like _get_summary_lines of the moves of the grouped
+        origins from their balances"""
+        pool = Pool()
+        SummaryBalance = pool.get('account.summary.balance')
+        balance = SummaryBalance.__table__()
+        cursor = Transaction().connection.cursor()
+
+        if not self._get_summary_grouped_origins():
+            return
+        columns = [balance.journal, balance.origin, balance.account]
+        cursor.execute(*balance.select(*columns,
+                Sum(balance.debit), Sum(balance.credit), Sum(balance.lines),
+                where=self._get_summary_balance_where(balance, period),
+                group_by=columns,
+                having=Sum(balance.moves) != 0,
+                order_by=columns))
+        for journal, origin, account, debit, credit, count in cursor:
+            yield (origin, journal, None, origin, account, debit, credit,
+                None, None, count, None, None)
+
+    def _get_summary_lines(self, period, ids):
+        """Yield the origin, journal, single move, key, account, debit, credit,
+        move description, line description, number of lines, last date and
+        party of each group and account of the moves with the ids"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        MoveLine = pool.get('account.move.line')
+        move = Move.__table__()
+        line = MoveLine.__table__()
+        first_line = MoveLine.__table__()
+        cursor = Transaction().connection.cursor()
+
+        origin, single_move, key = self._get_summary_group_columns(move)
+        party = self._get_summary_group_party(move)
+        if not party:
+            party = Literal(Null)
+        lines = move.join(line, condition=line.move == move.id).select(
+            origin.as_('origin'),
+            move.journal.as_('journal'),
+            single_move.as_('move'),
+            key.as_('key'),
+            move.description.as_('description'),
+            move.date.as_('date'),
+            party.as_('party'),
+            line.account.as_('account'),
+            line.debit.as_('debit'),
+            line.credit.as_('credit'),
+            line.id.as_('line'),
+            where=self._get_summary_move_where(move, period)
+            & reduce_ids(move.id, ids))
+        columns = [
+            lines.origin, lines.journal, lines.move, lines.key, lines.account]
+        groups = lines.select(*columns,
+            Sum(lines.debit).as_('debit'),
+            Sum(lines.credit).as_('credit'),
+            Max(lines.description).as_('description'),
+            # The description of single move lines is taken from the
+            # first line of the account as the lines are ordered by
+            # descending id
+            Min(lines.line).as_('line'),
+            Count(lines.line).as_('count'),
+            Max(lines.date).as_('date'),
+            Max(lines.party).as_('party'),
+            group_by=columns)
+        cursor.execute(*groups.join(first_line,
+                condition=first_line.id == groups.line
+                ).select(
+                groups.origin, groups.journal, groups.move, groups.key,
+                groups.account, groups.debit, groups.credit,
+                groups.description, first_line.description, groups.count,
+                groups.date, groups.party,
+                order_by=[groups.journal, groups.origin, groups.move,
+                    groups.account]))
+        yield from cursor
+
+    def _link_summary_moves(self, period, ids):
+        """Link the moves of the period with the ids to the summary move of
+        their group and return their number"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryBalance = pool.get('account.summary.balance')
+        move = Move.__table__()
+
+        where = (self._get_summary_move_where(move, period)
+            & reduce_ids(move.id, ids))
+        SummaryBalance._insert_moves(move, where, sign=-1)
+        return self._link_summary_moves_where(move, where)
+
+    def _link_summary_group_moves(self, period):
+        """Link the claimed moves of the period with a grouped origin to the
+        summary move of their group and return their number"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryBalance = pool.get('account.summary.balance')
+        move = Move.__table__()
+
+        if not self._get_summary_grouped_origins():
+            return 0
+        # Insert the opposite balances instead of deleting the rows which may
+        # be compacted by another transaction
+        where = (self._get_summary_move_where(move, period)
+            & move.id.in_(self._get_summary_group_claim(period)))
+        SummaryBalance._insert_moves(move, where, sign=-1)
+        return self._link_summary_moves_where(move, where)
+
+    def _link_summary_moves_where(self, move, where):
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        _, _, key = self._get_summary_group_columns(move)
+        cursor.execute(*move.update(
+                [move.summary_move],
+                [summary_move.id],
+                from_=[summary_move],
+                where=where
+                & (summary_move.summary == self.id)
+                & (summary_move.period == move.period)
+                & (summary_move.journal == move.journal)
+                & (summary_move.group_key == key)))
+        count = cursor.rowcount
+        clear_cache(Move)
+        return count
 
     @classmethod
     @ModelView.button
     @Workflow.transition('posted')
     def post(cls, summaries):
+        if config.getboolean(
+                'account_move_summary', 'post_queue', default=False):
+            cls.run_post(summaries)
+            return
+        cls._post_summaries(summaries)
+
+    @classmethod
+    @Workflow.transition('posting')
+    def run_post(cls, summaries):
+        "Dispatch the posting of each summary by batch to the queue workers"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+
+        chunk = config.getint(
+            'account_move_summary', 'post_chunk', default=10000)
+        for summary in summaries:
+            count = SummaryMove.search([
+                    ('summary', '=', summary.id),
+                    ('state', '=', 'draft'),
+                    ], count=True)
+            summary.tasks = -(-count // chunk) or 1
+            summary.tasks_done = 0
+            summary.moves_done = 0
+            with Transaction().set_context(queue_name='account_summary'):
+                cls.__queue__.post_part([summary])
+        cls.save(summaries)
+
+    @classmethod
+    def post_part(cls, summaries):
+        """Post a batch of the draft moves of the posting summaries and
+        push the next batch or set the summaries posted"""
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+
+        chunk = config.getint(
+            'account_move_summary', 'post_chunk', default=10000)
+        to_continue, to_post = [], []
         for summary in summaries:
-            summary._post_summary()
+            if summary.state != 'posting':
+                continue
+            with summary._record_run('post') as run:
+                summary._post_summary(run, limit=chunk)
+            summary.tasks_done = (summary.tasks_done or 0) + 1
+            summary.moves_done = (
+                (summary.moves_done or 0) + (run.summary_moves or 0))
+            # The batches are posted one after the other to keep the post
+            # numbers in the order of the dates
+            if SummaryMove.search([
+                        ('summary', '=', summary.id),
+                        ('state', '=', 'draft'),
+                        ], limit=1):
+                to_continue.append(summary)
+            else:
+                to_post.append(summary)
+        cls.save(summaries)
+        if to_continue:
+            with Transaction().set_context(queue_name='account_summary'):
+                cls.__queue__.post_part(to_continue)
+        cls._finish_post(to_post)
+        cls.posted(to_post)
+
+    @classmethod
+    @Workflow.transition('posted')
+    def posted(cls, summaries):
+        pass
 
-    def _post_summary(self):
-        SummaryMove = Pool().get('account.summary.move')
-        moves = SummaryMove.search([('summary', '=', self.id)],
-            order=[('date', 'ASC')])
-        SummaryMove.post([m for m in moves])
+    @classmethod
+    def _post_summaries(cls, summaries):
+        for summary in summaries:
+            with summary._record_run('post') as run:
+                summary._post_summary(run)
+            summary.moves_done = run.summary_moves or 0
+        cls.save(summaries)
+        cls._finish_post(summaries)
+
+    @classmethod
+    def _finish_post(cls, summaries):
+        "Invalidate and prerender the general journals of the summaries"
+        pool = Pool()
+        FiscalYear = pool.get('account.fiscalyear')
+        GeneralJournal = pool.get(
+            'account.summary.move.general_journal_pdf', type='report')
+
+        if not summaries:
+            return
+        fiscalyears = list({p.fiscalyear for s in summaries
+                for p in s.periods})
+        GeneralJournal.invalidate_cache(fiscalyears)
+        if config.getboolean(
+                'account_move_summary', 'report_prerender', default=False):
+            with Transaction().set_context(queue_name='account_summary'):
+                FiscalYear.__queue__.render_summary_general_journal(
+                    fiscalyears)
+
+    def _post_summary(self, run=None, limit=None):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        Run = pool.get('account.summary.run')
+
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        if run is None:
+            run = Run()
+        where = ((summary_move.summary == self.id)
+            & (summary_move.state == 'draft'))
+        if limit is not None:
+            # Post the first moves to number them before the next batches
+            cursor.execute(*summary_move.select(summary_move.id,
+                    where=where,
+                    order_by=[summary_move.date.asc, summary_move.id.asc],
+                    limit=limit))
+            where &= reduce_ids(summary_move.id, [i for i, in cursor])
+        with run.phase('number'):
+            SummaryMove._set_post_number(summary_move, where)
+        with run.phase('post'):
+            run.add('summary_moves',
+                SummaryMove._set_posted(summary_move, where))
 
     @classmethod
     def delete(cls, summaries):
         for summary in summaries:
-            if summary.state in ['calculated', 'posted']:
+            if summary.state in [
+                    'running', 'calculated', 'posting', 'posted']:
                 raise AccessError(
                     gettext('account_move_summary.msg_delete_posted_summary',
                         summary=summary.rec_name))
@@ -259,6 +1197,116 @@ class SummaryPeriod(ModelSQL):
         ondelete='CASCADE', required=True)
 
 
+class SummaryJournal(ModelSQL):
+    'Summary - Journal'
+    __name__ = 'account.summary.journal'
+
+    summary = fields.Many2One('account.summary', 'Summary',
+        ondelete='CASCADE', required=True)
+    journal = fields.Many2One('account.journal', 'Journal',
+        ondelete='CASCADE', required=True)
+
+
+class SummaryRun(ModelSQL, ModelView):
+    'Summary Run'
+    __name__ = 'account.summary.run'
+
+    summary = fields.Many2One('account.summary', 'Summary',
+        required=True, readonly=True, ondelete='CASCADE')
+    operation = fields.Selection([
+        ('compute', 'Compute'),
+        ('refresh', 'Refresh'),
+        ('post', 'Post'),
+        ], 'Operation', required=True, readonly=True)
+    date = fields.Timestamp('Date', readonly=True)
+    moves = fields.Integer('Moves', readonly=True,
+        help="The number of moves summarized.")
+    lines = fields.Integer('Lines', readonly=True,
+        help="The number of move lines aggregated.")
+    summary_moves = fields.Integer('Summary Moves', readonly=True,
+        help="The number of summary moves created or posted.")
+    summary_lines = fields.Integer('Summary Lines', readonly=True,
+        help="The number of summary lines created.")
+    queries = fields.Integer('SQL Statements', readonly=True)
+    duration = fields.Float('Duration', digits=(16, 3), readonly=True,
+        help="In seconds.")
+    search_duration = fields.Float('Search', digits=(16, 3), readonly=True)
+    aggregate_duration = fields.Float('Aggregate', digits=(16, 3),
+        readonly=True)
+    create_duration = fields.Float('Create', digits=(16, 3), readonly=True)
+    link_duration = fields.Float('Link', digits=(16, 3), readonly=True)
+    validate_duration = fields.Float('Validate', digits=(16, 3),
+        readonly=True)
+    number_duration = fields.Float('Number', digits=(16, 3), readonly=True)
+    post_duration = fields.Float('Post', digits=(16, 3), readonly=True)
+
+    _counters = ['moves', 'lines', 'summary_moves', 'summary_lines', 'queries']
+    _phases = [
+        'search', 'aggregate', 'create', 'link', 'validate', 'number', 'post']
+
+    @classmethod
+    def __setup__(cls):
+        super().__setup__()
+        cls._order.insert(0, ('date', 'DESC'))
+        cls._order.insert(1, ('id', 'DESC'))
+
+    @classmethod
+    def begin(cls, summary, operation):
+        "Return a new run of the operation on the summary"
+        run = cls(summary=summary, operation=operation,
+            date=dt.datetime.now())
+        for name in cls._counters:
+            setattr(run, name, 0)
+        for name in cls._phases:
+            setattr(run, '%s_duration' % name, 0)
+        return run
+
+    def finish(self, duration):
+        "Set the duration of the run and round the phase durations"
+        self.duration = round(duration, 3)
+        for name in self._phases:
+            name = '%s_duration' % name
+            setattr(self, name, round(getattr(self, name), 3))
+
+    def add(self, name, value=1):
+        setattr(self, name, (getattr(self, name, None) or 0) + value)
+
+    @contextmanager
+    def phase(self, name):
+        "Add the time spent in the block to the duration of the phase"
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add('%s_duration' % name, time.perf_counter() - start)
+
+    @contextmanager
+    def count_queries(self):
+        "Count the SQL statements executed by the transaction in the block"
+        connection = Transaction().connection
+        if backend.name == 'sqlite':
+            connection.set_trace_callback(lambda query: self.add('queries'))
+            try:
+                yield
+            finally:
+                connection.set_trace_callback(None)
+        elif hasattr(connection, 'cursor_factory'):
+            factory = connection.cursor_factory
+            run = self
+
+            class Cursor(factory):
+                def execute(self, query, *args, **kwargs):
+                    run.add('queries')
+                    return super().execute(query, *args, **kwargs)
+            connection.cursor_factory = Cursor
+            try:
+                yield
+            finally:
+                connection.cursor_factory = factory
+        else:
+            yield
+
+
 class SummaryMove(ModelSQL, ModelView):
     'Summary Move'
     __name__ = 'account.summary.move'
@@ -286,6 +1334,8 @@ class SummaryMove(ModelSQL, ModelView):
     summary = fields.Many2One('account.summary',
         'Summary', readonly=True,
         domain=[('company', '=', Eval('company', -1))])
+    group_key = fields.Char('Group Key', readonly=True,
+        help="The key which with the journal groups the summarized moves.")
     state = fields.Selection([
         ('draft', 'Draft'),
         ('posted', 'Posted'),
@@ -296,6 +1346,12 @@ class SummaryMove(ModelSQL, ModelView):
             'period': Eval('period'),
             'date': Eval('date'),
             })
+    total_debit = Monetary("Total Debit", currency='currency',
+        digits='currency', readonly=True)
+    total_credit = Monetary("Total Credit", currency='currency',
+        digits='currency', readonly=True)
+    currency = fields.Function(fields.Many2One('currency.currency',
+        "Currency"), 'on_change_with_currency')
 
     @classmethod
     def __setup__(cls):
@@ -303,6 +1359,84 @@ class SummaryMove(ModelSQL, ModelView):
         cls._check_modify_exclude = ['post_number', 'lines']
         cls._order.insert(0, ('date', 'DESC'))
         cls._order.insert(1, ('number', 'DESC'))
+        cls._sql_indexes.update(cls._summary_sql_indexes())
+
+    @classmethod
+    def _summary_sql_indexes(cls):
+        t = cls.__table__()
+        return {
+            # Post, draft and validation of a summary
+            Index(t, (t.summary, Index.Equality()),
+                (t.state, Index.Equality())),
+            # Linking of the summarized moves to their group
+            Index(t, (t.summary, Index.Equality()),
+                (t.period, Index.Equality()),
+                (t.journal, Index.Equality()),
+                (t.group_key, Index.Equality())),
+            # Reports of the fiscal year
+            Index(t, (t.period, Index.Equality()),
+                (t.state, Index.Equality())),
+            # Renumbering and ordering by post number
+            Index(t, (t.period, Index.Equality()),
+                (t.date, Index.Range()), (t.id, Index.Range()),
+                where=t.post_number != Null),
+            Index(t, (t.post_number, Index.Range()),
+                where=t.post_number != Null),
+            }
+
+    @classmethod
+    def __register__(cls, module_name):
+        exist = backend.TableHandler.table_exist(cls._table)
+        fill_totals = (exist
+            and not cls.__table_handler__(module_name).column_exist(
+                'total_debit'))
+        fill_keys = (exist
+            and not cls.__table_handler__(module_name).column_exist(
+                'group_key'))
+
+        super().__register__(module_name)
+
+        summary_move = cls.__table__()
+        # Migration from 7.0: store the totals
+        if fill_totals:
+            cls._update_totals(summary_move, summary_move.id != Null)
+
+        # Migration from 7.0: store the group keys
+        if fill_keys:
+            cls._fill_group_keys(summary_move, summary_move.group_key == Null)
+
+    @classmethod
+    def _fill_group_keys(cls, summary_move, where):
+        """Store the group keys of the moves computed with the default
+        grouping from their first linked move"""
+        pool = Pool()
+        Move = pool.get('account.move')
+        Summary = pool.get('account.summary')
+        move = Move.__table__()
+        linked = cls.__table__()
+        summary = Summary.__table__()
+        cursor = Transaction().connection.cursor()
+
+        # Like _get_summary_group_columns of the summary by origin model and
+        # period without grouped single moves
+        origin = SplitPart(move.origin, ',', 1)
+        grouped = (move.origin != Null) & (
+            (summary.summary_type == 'all_moves')
+            | (origin == 'account.invoice'))
+        key = Case((grouped, origin),
+            else_=Concat('account.move,', Cast(move.id, 'VARCHAR')))
+        keys = (move
+            .join(linked, condition=move.summary_move == linked.id)
+            .join(summary, condition=linked.summary == summary.id)
+            .select(
+                move.summary_move.as_('id'),
+                Min(key).as_('key'),
+                group_by=[move.summary_move]))
+        cursor.execute(*summary_move.update(
+                [summary_move.group_key], [keys.key],
+                from_=[keys],
+                where=where & (summary_move.id == keys.id)))
+        clear_cache(cls)
 
     @classmethod
     def order_post_number(cls, tables):
@@ -317,6 +1451,19 @@ class SummaryMove(ModelSQL, ModelView):
     def default_state():
         return 'draft'
 
+    @classmethod
+    def default_total_debit(cls):
+        return Decimal(0)
+
+    @classmethod
+    def default_total_credit(cls):
+        return Decimal(0)
+
+    @fields.depends('company')
+    def on_change_with_currency(self, name=None):
+        if self.company:
+            return self.company.currency.id
+
     @classmethod
     def search_rec_name(cls, name, clause):
         if clause[1].startswith('!') or clause[1].startswith('not '):
@@ -335,6 +1482,7 @@ class SummaryMove(ModelSQL, ModelView):
         context = Transaction().context
 
         journals = {}
+        to_number = defaultdict(list)
         default_company = cls.default_company()
         vlist = [x.copy() for x in vlist]
         for vals in vlist:
@@ -349,10 +1497,17 @@ class SummaryMove(ModelSQL, ModelView):
                     sequence = journal.get_multivalue(
                         'sequence', company=company_id)
                     if sequence:
-                        vals['number'] = sequence.get()
+                        to_number[sequence].append(vals)
+        # Reserve the numbers of each sequence at once
+        for sequence, sequence_vlist in to_number.items():
+            for vals, number in zip(
+                    sequence_vlist, sequence.get_many(len(sequence_vlist))):
+                vals['number'] = number
 
         moves = super(SummaryMove, cls).create(vlist)
-        cls.validate_move(moves)
+        # The moves created in bulk are validated once all their lines exist
+        if not context.get('_defer_validate_move'):
+            cls.validate_move(moves)
         return moves
 
     @classmethod
@@ -360,68 +1515,172 @@ class SummaryMove(ModelSQL, ModelView):
         '''
         Validate balanced move
         '''
+        summary_move = cls.__table__()
+
+        currencies = defaultdict(list)
+        for move in moves:
+            currencies[move.company.currency].append(move.id)
+        for currency, move_ids in currencies.items():
+            for sub_ids in grouped_slice(move_ids):
+                cls._validate_move_query(
+                    summary_move.select(summary_move.id,
+                        where=reduce_ids(summary_move.id, sub_ids)),
+                    currency)
+
+    @classmethod
+    def delete(cls, moves):
+        pool = Pool()
+        Move = pool.get('account.move')
+        SummaryBalance = pool.get('account.summary.balance')
+        move = Move.__table__()
+
+        # The released moves are summarized again by the next computation
+        for sub_ids in grouped_slice([m.id for m in moves]):
+            SummaryBalance._insert_moves(
+                move, reduce_ids(move.summary_move, sub_ids))
+        super().delete(moves)
+
+    @classmethod
+    def update_totals(cls, moves):
+        "Store the sums of the debit and credit of the lines of the moves"
+        summary_move = cls.__table__()
+        for sub_ids in grouped_slice([int(m) for m in moves if m]):
+            cls._update_totals(
+                summary_move, reduce_ids(summary_move.id, sub_ids))
+
+    @classmethod
+    def _update_totals(cls, summary_move, where):
         pool = Pool()
         SummaryMoveLine = pool.get('account.summary.move.line')
         line = SummaryMoveLine.__table__()
+        cursor = Transaction().connection.cursor()
 
+        def total(column):
+            return Coalesce(line.select(Sum(column),
+                    where=line.move == summary_move.id), 0)
+        cursor.execute(*summary_move.update(
+                [summary_move.total_debit, summary_move.total_credit],
+                [total(line.debit), total(line.credit)],
+                where=where))
+        clear_cache(cls)
+
+    @classmethod
+    def _validate_move_query(cls, query, currency):
+        '''
+        Set the lines of the moves selected by the query to valid if the move
+        is balanced and to draft otherwise
+        '''
+        pool = Pool()
+        SummaryMoveLine = pool.get('account.summary.move.line')
+        line = SummaryMoveLine.__table__()
+        balance = cls.__table__()
         cursor = Transaction().connection.cursor()
 
-        amounts = {}
-        move2draft_lines = {}
-        for sub_move_ids in grouped_slice([m.id for m in moves]):
-            red_sql = reduce_ids(line.move, sub_move_ids)
-
-            cursor.execute(*line.select(line.move,
-                    Sum(line.debit - line.credit),
-                    where=red_sql,
-                    group_by=line.move))
-            amounts.update(dict(cursor))
-
-            cursor.execute(*line.select(line.move, line.id,
-                    where=red_sql & (line.state == 'draft'),
-                    order_by=line.move))
-            move2draft_lines.update(dict((k, [j[1] for j in g])
-                    for k, g in groupby(cursor, itemgetter(0))))
-
-        valid_moves = []
-        draft_moves = []
-        for move in moves:
-            if move.id not in amounts:
-                continue
-            amount = amounts[move.id]
-            # SQLite uses float for SUM
-            if not isinstance(amount, Decimal):
-                amount = Decimal(amount)
-            draft_lines = SummaryMoveLine.browse(
-                move2draft_lines.get(move.id, []))
-            if not move.company.currency.is_zero(amount):
-                draft_moves.append(move.id)
-                continue
-            if not draft_lines:
-                continue
-            valid_moves.append(move.id)
-        for move_ids, state in (
-                (valid_moves, 'valid'),
-                (draft_moves, 'draft'),
-                ):
-            if move_ids:
-                for sub_ids in grouped_slice(move_ids):
-                    red_sql = reduce_ids(line.move, sub_ids)
-                    # Use SQL to prevent double validate loop
-                    cursor.execute(*line.update(
-                            columns=[line.state],
-                            values=[state],
-                            where=red_sql))
+        # Like Currency.is_zero with the amounts rounded half to even
+        # The value must be casted as Decimal is adapted to bytes by SQLite
+        threshold = Cast(Literal(currency.rounding / 2),
+            cls.total_debit.sql_type().base)
+        unbalanced = balance.select(balance.id,
+            where=balance.id.in_(query)
+            & (Abs(balance.total_debit - balance.total_credit) > threshold))
+        # Use SQL to prevent double validate loop
+        cursor.execute(*line.update(
+                [line.state],
+                [Case((line.move.in_(unbalanced), 'draft'), else_='valid')],
+                where=line.move.in_(query)))
+        clear_cache(SummaryMoveLine)
 
     @classmethod
     def post(cls, moves):
-        for move in moves:
-            move.state = 'posted'
-            if not move.post_number:
-                move.post_date = move.date
-                move.post_number = \
-                    move.period.post_summary_move_sequence_used.get()
-        cls.save(moves)
+        pool = Pool()
+        GeneralJournal = pool.get(
+            'account.summary.move.general_journal_pdf', type='report')
+        summary_move = cls.__table__()
+        where = reduce_ids(summary_move.id, [m.id for m in moves])
+        cls._set_post_number(summary_move, where)
+        cls._set_posted(summary_move, where)
+        GeneralJournal.invalidate_cache(
+            list({m.period.fiscalyear for m in moves}))
+
+    @classmethod
+    def _set_post_number(cls, summary_move, where):
+        '''
+        Number the moves without post number matching the where clause in
+        (date, id) order with the numbers reserved from the post sequences
+        '''
+        pool = Pool()
+        Period = pool.get('account.period')
+        cursor = Transaction().connection.cursor()
+
+        cursor.execute(*summary_move.select(
+                summary_move.id, summary_move.period,
+                where=where & (summary_move.post_number == Null),
+                order_by=[summary_move.date.asc, summary_move.id.asc]))
+        rows = cursor.fetchall()
+
+        sequences = {p.id: p.post_summary_move_sequence_used
+            for p in Period.browse(list({p for _, p in rows}))}
+        to_number = defaultdict(list)
+        for move_id, period_id in rows:
+            to_number[sequences[period_id]].append(move_id)
+        numbers = {}
+        for sequence, move_ids in to_number.items():
+            numbers.update(zip(move_ids, sequence.get_many(len(move_ids))))
+        cls._write_post_number(numbers, post_date=True)
+
+    @classmethod
+    def _write_post_number(cls, numbers, post_date=False):
+        '''
+        Write the post number of the moves from the dictionary of numbers by
+        id and set the post date to the date if post_date is set
+        '''
+        summary_move = cls.__table__()
+        cursor = Transaction().connection.cursor()
+
+        for sub_ids in grouped_slice(list(numbers)):
+            sub_ids = list(sub_ids)
+            columns = [summary_move.post_number,
+                summary_move.write_uid, summary_move.write_date]
+            values = [Case(
+                    *((summary_move.id == i, numbers[i]) for i in sub_ids)),
+                Transaction().user, CurrentTimestamp()]
+            if post_date:
+                columns.append(summary_move.post_date)
+                values.append(summary_move.date)
+            cursor.execute(*summary_move.update(columns, values,
+                    where=reduce_ids(summary_move.id, sub_ids)))
+        clear_cache(cls)
+
+    @classmethod
+    def _set_posted(cls, summary_move, where):
+        "Post the moves matching the where clause and return their number"
+        cursor = Transaction().connection.cursor()
+
+        cursor.execute(*summary_move.update(
+                [summary_move.state,
+                    summary_move.write_uid, summary_move.write_date],
+                ['posted', Transaction().user, CurrentTimestamp()],
+                where=where))
+        clear_cache(cls)
+        return cursor.rowcount
+
+
+def _order_move_field(name):
+    "Return the orderer of the line field from the summary move field"
+    def order_field(cls, tables):
+        pool = Pool()
+        Move = pool.get('account.summary.move')
+        field = Move._fields[name]
+        table, _ = tables[None]
+        move_tables = tables.get('move')
+        if move_tables is None:
+            move = Move.__table__()
+            move_tables = {
+                None: (move, move.id == table.move),
+                }
+            tables['move'] = move_tables
+        return field.convert_order(name, move_tables, Move)
+    return classmethod(order_field)
 
 
 class SummaryLine(ModelSQL, ModelView):
@@ -459,17 +1718,17 @@ class SummaryLine(ModelSQL, ModelView):
                 & Bool(Eval('move'))),
             })
     period = fields.Function(fields.Many2One('account.period', 'Period',
-        states=_LINE_STATES), 'get_move_field',
+        states=_LINE_STATES), 'get_move_fields',
         setter='set_move_field', searcher='search_move_field')
     company = fields.Function(fields.Many2One('company.company', "Company",
-        states=_LINE_STATES), 'get_move_field',
+        states=_LINE_STATES), 'get_move_fields',
         setter='set_move_field', searcher='search_move_field')
     date = fields.Function(fields.Date('Effective Date', required=True,
-        states=_LINE_STATES), 'on_change_with_date',
+        states=_LINE_STATES), 'get_move_fields',
         setter='set_move_field', searcher='search_move_field')
     description = fields.Char('Description', states=_LINE_STATES)
     move_description = fields.Function(fields.Char('Move Description',
-        states=_LINE_STATES), 'get_move_field',
+        states=_LINE_STATES), 'get_move_fields',
         setter='set_move_field', searcher='search_move_field')
     amount_second_currency = Monetary("Amount Second Currency",
         currency='second_currency', digits='second_currency',
@@ -499,14 +1758,28 @@ class SummaryLine(ModelSQL, ModelView):
         ], 'State', readonly=True, required=True)
     move_state = fields.Function(
         fields.Selection('get_move_states', "Move State"),
-        'on_change_with_move_state', searcher='search_move_field')
+        'get_move_fields', searcher='search_move_field')
     currency = fields.Function(fields.Many2One('currency.currency',
-        "Currency"), 'on_change_with_currency')
+        "Currency"), 'get_amounts')
     amount = fields.Function(Monetary("Amount",
         currency='amount_currency', digits='amount_currency'),
-        'get_amount')
+        'get_amounts')
     amount_currency = fields.Function(fields.Many2One('currency.currency',
-        'Amount Currency'), 'get_amount_currency')
+        'Amount Currency'), 'get_amounts')
+
+    @classmethod
+    def __setup__(cls):
+        super().__setup__()
+        cls._sql_indexes.update(cls._summary_sql_indexes())
+
+    @classmethod
+    def _summary_sql_indexes(cls):
+        t = cls.__table__()
+        return {
+            # Validation of the moves
+            Index(t, (t.move, Index.Equality()),
+                (t.state, Index.Equality())),
+            }
 
     @classmethod
     def default_company(cls):
@@ -516,6 +1789,38 @@ class SummaryLine(ModelSQL, ModelView):
     def default_state():
         return 'draft'
 
+    @classmethod
+    def create(cls, vlist):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        lines = super().create(vlist)
+        SummaryMove.update_totals({l.move for l in lines})
+        return lines
+
+    @classmethod
+    def write(cls, *args):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        moves = set()
+        actions = iter(args)
+        for lines, values in zip(actions, actions):
+            if values.keys() & {'debit', 'credit', 'move'}:
+                moves.update(l.move for l in lines)
+        super().write(*args)
+        actions = iter(args)
+        for lines, values in zip(actions, actions):
+            if 'move' in values:
+                moves.update(l.move for l in lines)
+        SummaryMove.update_totals(moves)
+
+    @classmethod
+    def delete(cls, lines):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        moves = {l.move for l in lines}
+        super().delete(lines)
+        SummaryMove.update_totals(moves)
+
     @fields.depends('account')
     def on_change_with_currency(self, name=None):
         if self.account:
@@ -526,16 +1831,30 @@ class SummaryLine(ModelSQL, ModelView):
         if self.account and self.account.second_currency:
             return self.account.second_currency.id
 
-    def get_move_field(self, name):
-        field = getattr(self.__class__, name)
-        if name.startswith('move_'):
-            name = name[5:]
-        value = getattr(self.move, name)
-        if isinstance(value, ModelSQL):
-            if field._type == 'reference':
-                return str(value)
-            return value.id
-        return value
+    @classmethod
+    def get_move_fields(cls, lines, names):
+        "Return the values of the move fields with a query per batch of lines"
+        pool = Pool()
+        Move = pool.get('account.summary.move')
+        line = cls.__table__()
+        move = Move.__table__()
+        cursor = Transaction().connection.cursor()
+
+        columns = []
+        for name in names:
+            if name.startswith('move_'):
+                name = name[5:]
+            columns.append(Column(move, name))
+        result = {n: {} for n in names}
+        for sub_lines in grouped_slice(lines):
+            cursor.execute(*line.join(move, 'LEFT',
+                    condition=line.move == move.id
+                    ).select(line.id, *columns,
+                    where=reduce_ids(line.id, [l.id for l in sub_lines])))
+            for line_id, *values in cursor:
+                for name, value in zip(names, values):
+                    result[name][line_id] = value
+        return result
 
     @fields.depends('move', '_parent_move.date')
     def on_change_with_date(self, name=None):
@@ -555,10 +1874,20 @@ class SummaryLine(ModelSQL, ModelView):
 
     @classmethod
     def search_move_field(cls, name, clause):
-        nested = clause[0].lstrip(name)
+        pool = Pool()
+        Move = pool.get('account.summary.move')
+        nested = clause[0][len(name):]
         if name.startswith('move_'):
             name = name[5:]
-        return [('move.' + name + nested,) + tuple(clause[1:])]
+        query = Move.search(
+            [(name + nested,) + tuple(clause[1:])], order=[], query=True)
+        return [('move', 'in', query)]
+
+    order_period = _order_move_field('period')
+    order_company = _order_move_field('company')
+    order_date = _order_move_field('date')
+    order_move_description = _order_move_field('description')
+    order_move_state = _order_move_field('state')
 
     @classmethod
     def get_move_states(cls):
@@ -571,20 +1900,44 @@ class SummaryLine(ModelSQL, ModelView):
         if self.move:
             return self.move.state
 
-    def get_amount(self, name):
-        sign = -1 if self.account.type.statement == 'income' else 1
-        if self.amount_second_currency is not None:
-            return self.amount_second_currency * sign
-        else:
-            return (self.debit - self.credit) * sign
+    @classmethod
+    def get_amounts(cls, lines, names):
+        "Return the amounts and currencies with a query per batch of lines"
+        pool = Pool()
+        Account = pool.get('account.account')
+        AccountType = pool.get('account.account.type')
+        Company = pool.get('company.company')
+        line = cls.__table__()
+        account = Account.__table__()
+        account_type = AccountType.__table__()
+        company = Company.__table__()
+        cursor = Transaction().connection.cursor()
 
-    def get_amount_currency(self, name):
-        if self.second_currency:
-            currency = self.second_currency
-        else:
-            currency = self.account.currency
-        if name == 'amount_currency':
-            return currency.id
+        sign = Case((account_type.statement == 'income', -1), else_=1)
+        columns = {
+            'amount': Coalesce(
+                line.amount_second_currency, line.debit - line.credit) * sign,
+            'amount_currency': Coalesce(
+                line.second_currency, company.currency),
+            'currency': company.currency,
+            }
+        result = {n: {} for n in names}
+        for sub_lines in grouped_slice(lines):
+            cursor.execute(*line.join(account,
+                    condition=line.account == account.id
+                    ).join(account_type, 'LEFT',
+                    condition=account.type == account_type.id
+                    ).join(company,
+                    condition=account.company == company.id
+                    ).select(line.id, *(columns[n] for n in names),
+                    where=reduce_ids(line.id, [l.id for l in sub_lines])))
+            for line_id, *values in cursor:
+                for name, value in zip(names, values):
+                    # SQLite uses float for arithmetic
+                    if name == 'amount' and not isinstance(value, Decimal):
+                        value = Decimal(str(value))
+                    result[name][line_id] = value
+        return result
 
     def get_rec_name(self, name):
         if self.debit > self.credit:
@@ -597,6 +1950,175 @@ class SummaryLine(ModelSQL, ModelView):
         return [('account.rec_name',) + tuple(clause[1:])]
 
 
+class SummaryBalance(ModelSQL):
+    """Summary Balance
+
+    The amounts of the lines of the posted moves not yet summarized by
+    account, journal and origin model.
+    The rows are added as deltas and compacted after the computations.
+    """
+    __name__ = 'account.summary.balance'
+
+    company = fields.Many2One('company.company', 'Company',
+        required=True, ondelete='CASCADE')
+    period = fields.Many2One('account.period', 'Period',
+        required=True, ondelete='CASCADE')
+    journal = fields.Many2One('account.journal', 'Journal',
+        required=True, ondelete='CASCADE',
+        context={'company': Eval('company', -1)}, depends={'company'})
+    origin = fields.Char('Origin Model')
+    account = fields.Many2One('account.account', 'Account',
+        required=True, ondelete='CASCADE')
+    debit = fields.Numeric('Debit', required=True)
+    credit = fields.Numeric('Credit', required=True)
+    moves = fields.Integer('Moves', required=True)
+    lines = fields.Integer('Lines', required=True)
+
+    @classmethod
+    def __setup__(cls):
+        super().__setup__()
+        t = cls.__table__()
+        cls._sql_indexes.add(
+            Index(t, (t.company, Index.Equality()),
+                (t.period, Index.Equality()),
+                (t.journal, Index.Equality()),
+                (t.origin, Index.Equality())))
+
+    @classmethod
+    def __register__(cls, module_name):
+        fill = not backend.TableHandler.table_exist(cls._table)
+
+        super().__register__(module_name)
+
+        if fill:
+            cls.rebuild()
+
+    @classmethod
+    def add_moves(cls, moves):
+        "Add the lines of the posted moves to the balances"
+        pool = Pool()
+        Move = pool.get('account.move')
+        move = Move.__table__()
+
+        for sub_ids in grouped_slice([m.id for m in moves]):
+            cls._insert_moves(move, reduce_ids(move.id, sub_ids)
+                & (move.state == 'posted') & (move.summary_move == Null))
+
+    @classmethod
+    def _insert_moves(cls, move, where, sign=1):
+        "Insert the balances of the lines of the moves matching where"
+        pool = Pool()
+        MoveLine = pool.get('account.move.line')
+        line = MoveLine.__table__()
+        balance = cls.__table__()
+        cursor = Transaction().connection.cursor()
+
+        columns = [move.company, move.period, move.journal,
+            SplitPart(move.origin, ',', 1), line.account]
+        cursor.execute(*balance.insert([
+                    balance.create_uid, balance.create_date,
+                    balance.company, balance.period, balance.journal,
+                    balance.origin, balance.account,
+                    balance.debit, balance.credit,
+                    balance.moves, balance.lines,
+                    ],
+                move.join(line, condition=line.move == move.id).select(
+                    Literal(Transaction().user), CurrentTimestamp(),
+                    *columns,
+                    Sum(line.debit) * sign, Sum(line.credit) * sign,
+                    Count(move.id, distinct=True) * sign,
+                    Count(line.id) * sign,
+                    where=where,
+                    group_by=columns)))
+
+    @classmethod
+    def compact(cls, company, period, journals=None):
+        """Replace the balances of the period and journals by their sum and
+        remove those without moves
+
+        The balances claimed by other transactions are skipped if the database
+        supports it."""
+        balance = cls.__table__()
+        claim = cls.__table__()
+        transaction = Transaction()
+        database = transaction.database
+        cursor = transaction.connection.cursor()
+
+        def get_where(balance):
+            where = ((balance.company == company.id)
+                & (balance.period == period.id))
+            if journals:
+                where &= balance.journal.in_(journals)
+            return where
+        where = get_where(balance)
+        cursor.execute(*balance.select(Max(balance.id), where=where))
+        last, = cursor.fetchone()
+        if last is None:
+            return
+        where &= balance.id <= last
+        if database.has_select_for():
+            For = database.get_select_for_skip_locked()
+            where &= balance.id.in_(claim.select(claim.id,
+                    where=get_where(claim) & (claim.id <= last),
+                    for_=For('UPDATE')))
+        columns = [balance.company, balance.period, balance.journal,
+            balance.origin, balance.account]
+        cursor.execute(*balance.insert([
+                    balance.create_uid, balance.create_date,
+                    *columns,
+                    balance.debit, balance.credit,
+                    balance.moves, balance.lines,
+                    ],
+                balance.select(
+                    Literal(Transaction().user), CurrentTimestamp(),
+                    *columns,
+                    Sum(balance.debit), Sum(balance.credit),
+                    Sum(balance.moves), Sum(balance.lines),
+                    where=where,
+                    group_by=columns,
+                    having=Sum(balance.moves) != 0)))
+        cursor.execute(*balance.delete(where=where))
+
+    @classmethod
+    def compact_balances(cls):
+        "Compact the balances of the periods with many rows by key"
+        pool = Pool()
+        Company = pool.get('company.company')
+        Period = pool.get('account.period')
+        balance = cls.__table__()
+        cursor = Transaction().connection.cursor()
+
+        columns = [balance.company, balance.period, balance.journal,
+            balance.origin, balance.account]
+        duplicates = balance.select(balance.company, balance.period,
+            group_by=columns,
+            having=Count(Literal('*')) > 1)
+        cursor.execute(*duplicates.select(
+                duplicates.company, duplicates.period,
+                group_by=[duplicates.company, duplicates.period]))
+        for company, period in cursor.fetchall():
+            cls.compact(Company(company), Period(period))
+
+    @classmethod
+    def rebuild(cls, periods=None):
+        "Compute again the balances of the periods or of all the moves"
+        pool = Pool()
+        Move = pool.get('account.move')
+        move = Move.__table__()
+        balance = cls.__table__()
+        cursor = Transaction().connection.cursor()
+
+        where = (move.state == 'posted') & (move.summary_move == Null)
+        if periods is None:
+            cursor.execute(*balance.delete())
+        else:
+            period_ids = [p.id for p in periods]
+            cursor.execute(*balance.delete(
+                    where=balance.period.in_(period_ids)))
+            where &= move.period.in_(period_ids)
+        cls._insert_moves(move, where)
+
+
 class Move(metaclass=PoolMeta):
     __name__ = 'account.move'
 
@@ -608,6 +2130,19 @@ class Move(metaclass=PoolMeta):
     def __setup__(cls):
         super(Move, cls).__setup__()
         cls._check_modify_exclude.append('summary_move')
+        cls._sql_indexes.update(cls._summary_sql_indexes())
+
+    @classmethod
+    def _summary_sql_indexes(cls):
+        t = cls.__table__()
+        return {
+            # Moves to summarize by chunk of ids
+            Index(t, (t.company, Index.Equality()),
+                (t.period, Index.Equality()), (t.id, Index.Range()),
+                where=(t.summary_move == Null) & (t.state == 'posted')),
+            Index(t, (t.summary_move, Index.Equality()),
+                where=t.summary_move != Null),
+            }
 
     @classmethod
     def copy(cls, moves, default=None):
@@ -618,6 +2153,80 @@ class Move(metaclass=PoolMeta):
         default['summary_move'] = None
         return super().copy(moves, default=default)
 
+    @dualmethod
+    @ModelView.button
+    def post(cls, moves):
+        pool = Pool()
+        SummaryBalance = pool.get('account.summary.balance')
+        to_add = [m for m in moves if m.state != 'posted']
+        super().post(moves)
+        # The cancellations are posted moves
+        SummaryBalance.add_moves(to_add)
+
+
+class PreviewSummaryShow(ModelView):
+    'Preview Summary'
+    __name__ = 'account.summary.preview.show'
+
+    summary = fields.Many2One('account.summary', 'Summary', readonly=True)
+    moves = fields.Integer('Moves', readonly=True,
+        help="The number of moves to summarize.")
+    summary_moves = fields.Integer('Summary Moves', readonly=True,
+        help="The number of summary moves to create.")
+    summary_lines = fields.Integer('Summary Lines', readonly=True,
+        help="The number of summary lines to create.")
+    groups = fields.One2Many('account.summary.preview.show.group', None,
+        'Groups', readonly=True)
+    accounts = fields.One2Many('account.summary.preview.show.account', None,
+        'Accounts', readonly=True)
+
+
+class PreviewSummaryShowGroup(ModelView):
+    'Preview Summary Group'
+    __name__ = 'account.summary.preview.show.group'
+
+    period = fields.Many2One('account.period', 'Period', readonly=True)
+    journal = fields.Many2One('account.journal', 'Journal', readonly=True)
+    description = fields.Char('Description', readonly=True)
+    lines = fields.Integer('Lines', readonly=True,
+        help="The number of summarized lines.")
+    debit = Monetary('Debit', currency='currency', digits='currency',
+        readonly=True)
+    credit = Monetary('Credit', currency='currency', digits='currency',
+        readonly=True)
+    currency = fields.Many2One('currency.currency', 'Currency', readonly=True)
+
+
+class PreviewSummaryShowAccount(ModelView):
+    'Preview Summary Account'
+    __name__ = 'account.summary.preview.show.account'
+
+    account = fields.Many2One('account.account', 'Account', readonly=True)
+    debit = Monetary('Debit', currency='currency', digits='currency',
+        readonly=True)
+    credit = Monetary('Credit', currency='currency', digits='currency',
+        readonly=True)
+    currency = fields.Many2One('currency.currency', 'Currency', readonly=True)
+
+
+class PreviewSummary(Wizard):
+    'Preview Summary'
+    __name__ = 'account.summary.preview'
+
+    start_state = 'show'
+    show = StateView('account.summary.preview.show',
+        'account_move_summary.summary_preview_show_view_form', [
+            Button('Close', 'end', 'tryton-close', default=True),
+            ])
+
+    def default_show(self, fields):
+        preview = self.record._preview_summary()
+        currency = self.record.company.currency.id
+        for value in preview['groups'] + preview['accounts']:
+            value['currency'] = currency
+        preview['summary'] = self.record.id
+        return preview
+
 
 class RenumberSummaryMovesStart(ModelView):
     '''Renumber Summary Account Moves Start'''
@@ -641,6 +2250,31 @@ class RenumberSummaryMovesStart(ModelView):
         return 2
 
 
+class RenumberSummaryMovesPreview(ModelView):
+    '''Renumber Summary Account Moves Preview'''
+    __name__ = 'account.summary.move.renumber.preview'
+
+    changed = fields.Integer('Changed Moves', readonly=True,
+        help="The number of moves of which the post number changes.")
+    first_change = fields.Char('First Change', readonly=True)
+    last_change = fields.Char('Last Change', readonly=True)
+    page = fields.Integer('Page', readonly=True)
+    pages = fields.Integer('Pages', readonly=True)
+    current_page = fields.Integer('Current Page')
+    lines = fields.One2Many('account.summary.move.renumber.preview.line',
+        None, 'Changes', readonly=True)
+
+
+class RenumberSummaryMovesPreviewLine(ModelView):
+    '''Renumber Summary Account Moves Preview Line'''
+    __name__ = 'account.summary.move.renumber.preview.line'
+
+    move = fields.Many2One('account.summary.move', 'Move', readonly=True)
+    date = fields.Date('Date', readonly=True)
+    old_number = fields.Char('Old Number', readonly=True)
+    new_number = fields.Char('New Number', readonly=True)
+
+
 class RenumberSummaryMoves(Wizard):
     '''Renumber Summary Account Moves'''
     __name__ = 'account.summary.move.renumber'
@@ -649,20 +2283,95 @@ class RenumberSummaryMoves(Wizard):
         'account_move_summary.summary_move_renumber_start_view_form',
             [
                 Button('Cancel', 'end', 'tryton-cancel'),
+                Button('Preview', 'preview', 'tryton-search'),
                 Button('Renumber', 'renumber', 'tryton-ok', default=True),
             ])
+    preview = StateView('account.summary.move.renumber.preview',
+        'account_move_summary.summary_move_renumber_preview_view_form', [
+            Button('Back', 'start', 'tryton-back'),
+            Button('Previous', 'preview_previous', 'tryton-back'),
+            Button('Next', 'preview_next', 'tryton-forward'),
+            Button('Renumber', 'renumber', 'tryton-ok', default=True),
+            ])
+    preview_previous = StateTransition()
+    preview_next = StateTransition()
     renumber = StateAction('account_move_summary.act_summary_move_form')
 
+    _preview_page_size = 100
+
+    def default_preview(self, fields):
+        "Compute the changes of the renumbering without writing them"
+        cursor = Transaction().connection.cursor()
+
+        mapping = self._get_renumber_mapping()
+        if mapping is None:
+            return {
+                'changed': 0,
+                'page': 0,
+                'pages': 0,
+                'current_page': 0,
+                'lines': [],
+                }
+        where = ((mapping.post_number != mapping.number)
+            | (mapping.post_number == Null))
+        cursor.execute(*mapping.select(Count(Literal('*')), where=where))
+        changed, = cursor.fetchone()
+
+        def change(order):
+            cursor.execute(*mapping.select(
+                    mapping.post_number, mapping.number,
+                    where=where,
+                    order_by=[order(mapping.date), order(mapping.id)],
+                    limit=1))
+            row = cursor.fetchone()
+            if row:
+                return '%s → %s' % (row[0] or '', row[1])
+
+        size = self._preview_page_size
+        pages = (changed + size - 1) // size
+        page = getattr(self.preview, 'current_page', 0) or 0
+        page = max(min(page, pages - 1), 0)
+        self.preview.current_page = page
+        cursor.execute(*mapping.select(
+                mapping.id, mapping.date, mapping.post_number, mapping.number,
+                where=where,
+                order_by=[mapping.date.asc, mapping.id.asc],
+                limit=size, offset=page * size))
+        lines = [{
+                'move': i,
+                'date': d,
+                'old_number': o,
+                'new_number': n,
+                } for i, d, o, n in cursor]
+        return {
+            'changed': changed,
+            'first_change': change(lambda c: c.asc),
+            'last_change': change(lambda c: c.desc),
+            'page': page,
+            'pages': pages,
+            'current_page': page,
+            'lines': lines,
+            }
+
+    def transition_preview_previous(self):
+        page = getattr(self.preview, 'current_page', 0) or 0
+        self.preview.current_page = page - 1
+        return 'preview'
+
+    def transition_preview_next(self):
+        page = getattr(self.preview, 'current_page', 0) or 0
+        self.preview.current_page = page + 1
+        return 'preview'
+
     def do_renumber(self, action):
         pool = Pool()
         SummaryMove = pool.get('account.summary.move')
-        Sequence = pool.get('ir.sequence')
         Warning = pool.get('res.user.warning')
 
         draft_moves = SummaryMove.search([
                 ('period.fiscalyear', '=', self.start.fiscalyear.id),
                 ('state', '=', 'draft'),
-                ])
+                ], limit=1)
         if draft_moves:
             key = 'move_renumber_draft_moves%s' % self.start.fiscalyear.id
             if Warning.check(key):
@@ -671,69 +2380,7 @@ class RenumberSummaryMoves(Wizard):
                         'account_move_summary.draft_moves_in_fiscalyear',
                         fiscalyear=self.start.fiscalyear.rec_name))
 
-        sequences = set([self.start.fiscalyear.post_summary_move_sequence])
-        for period in self.start.fiscalyear.periods:
-            if period.post_summary_move_sequence:
-                sequences.add(period.post_summary_move_sequence)
-        sequences = list(filter(None, sequences))
-
-        Sequence.write(sequences, {
-                'number_next': self.start.first_number,
-                })
-
-        moves_to_renumber = SummaryMove.search([
-                ('period.fiscalyear', '=', self.start.fiscalyear.id),
-                ('post_number', '!=', None),
-                ],
-            order=[
-                ('date', 'ASC'),
-                ('id', 'ASC'),
-                ])
-
-        first_move = self.start.first_move
-        last_1_move = self.start.last_1_move
-        last_2_move = self.start.last_2_move
-        last_3_move = self.start.last_3_move
-
-        to_write = []
-        for move in moves_to_renumber:
-            if move == first_move:
-                number_next_old = \
-                    move.period.post_summary_move_sequence_used.number_next
-                Sequence.write(sequences, {
-                    'number_next': 1,
-                    })
-                to_write.extend(([move], {
-                    'post_number':
-                        move.period.post_summary_move_sequence_used.get(),
-                    }))
-                Sequence.write(sequences, {
-                    'number_next': number_next_old,
-                    })
-                continue
-            if move in (last_1_move, last_2_move, last_3_move):
-                continue
-            to_write.extend(([move], {
-                'post_number': (
-                    move.period.post_summary_move_sequence_used.get()),
-                }))
-        if last_1_move:
-            to_write.extend(([last_1_move], {
-                'post_number': (
-                    last_1_move.period.post_summary_move_sequence_used.get()),
-                }))
-        if last_2_move:
-            to_write.extend(([last_2_move], {
-                'post_number': (
-                    last_2_move.period.post_summary_move_sequence_used.get()),
-                }))
-        if last_3_move:
-            to_write.extend(([last_3_move], {
-                'post_number': (
-                    last_3_move.period.post_summary_move_sequence_used.get()),
-                }))
-        if to_write:
-            SummaryMove.write(*to_write)
+        self._renumber()
 
         action['pyson_domain'] = PYSONEncoder().encode([
             ('period.fiscalyear', '=', self.start.fiscalyear.id),
@@ -741,10 +2388,180 @@ class RenumberSummaryMoves(Wizard):
             ])
         return action, {}
 
+    def _get_renumber_sequences(self):
+        "Return the post sequences of the fiscal year with their periods"
+        fiscalyear = self.start.fiscalyear
+        sequences = {}
+        if fiscalyear.post_summary_move_sequence:
+            sequences[fiscalyear.post_summary_move_sequence] = []
+        for period in fiscalyear.periods:
+            sequence = period.post_summary_move_sequence_used
+            if sequence:
+                sequences.setdefault(sequence, []).append(period.id)
+        return sequences
+
+    def _get_renumber_first_move(self):
+        "Return the first move which is numbered 1 if it has a post number"
+        first_move = self.start.first_move
+        if first_move and first_move.post_number:
+            return first_move
+
+    def _get_renumber_special_moves(self):
+        "Return the last moves which are numbered after the others"
+        return [m for m in [
+                self.start.last_1_move,
+                self.start.last_2_move,
+                self.start.last_3_move,
+                ] if m]
+
+    def _get_renumber_query(self, sequence, periods):
+        """Return the query of the id, the date, the post number and the new
+        number of the moves of the periods numbered by the sequence"""
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+
+        excluded = [m.id for m in self._get_renumber_special_moves()]
+        if self.start.first_move:
+            excluded.append(self.start.first_move.id)
+        where = (summary_move.period.in_(periods or [-1])
+            & (summary_move.post_number != Null))
+        if excluded:
+            where &= ~summary_move.id.in_(excluded)
+        row_number = RowNumber(window=Window([],
+                order_by=[summary_move.date.asc, summary_move.id.asc]))
+        number = ((row_number - 1) * sequence.number_increment
+            + self.start.first_number)
+        return summary_move.select(
+            summary_move.id.as_('id'),
+            summary_move.date.as_('date'),
+            summary_move.post_number.as_('post_number'),
+            sequence.format_number_sql(number).as_('number'),
+            where=where)
+
+    def _get_renumber_special_numbers(self, counts):
+        '''
+        Return the new numbers by id of the first and last moves numbered by
+        incremental sequences and the next number of these sequences from the
+        number of the other moves they number
+        '''
+        first_number = self.start.first_number
+        number_next = {s: first_number + c * s.number_increment
+            for s, c in counts.items()}
+        numbers = {}
+        first_move = self._get_renumber_first_move()
+        if first_move:
+            sequence = first_move.period.post_summary_move_sequence_used
+            if sequence.type == 'incremental':
+                numbers[first_move.id] = sequence.format_number(1)
+        for move in self._get_renumber_special_moves():
+            sequence = move.period.post_summary_move_sequence_used
+            if sequence.type == 'incremental':
+                number = number_next.get(sequence, first_number)
+                numbers[move.id] = sequence.format_number(number)
+                number_next[sequence] = number + sequence.number_increment
+        return numbers, number_next
+
+    def _get_renumber_mapping(self):
+        '''
+        Return the query of the id, the date, the post number and the new
+        number of the moves renumbered by incremental sequences
+        '''
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        queries = []
+        counts = {}
+        for sequence, periods in self._get_renumber_sequences().items():
+            if sequence.type != 'incremental':
+                continue
+            query = self._get_renumber_query(sequence, periods)
+            cursor.execute(*query.select(Count(Literal('*'))))
+            counts[sequence], = cursor.fetchone()
+            queries.append(query)
+        numbers, _ = self._get_renumber_special_numbers(counts)
+        if numbers:
+            queries.append(summary_move.select(
+                    summary_move.id.as_('id'),
+                    summary_move.date.as_('date'),
+                    summary_move.post_number.as_('post_number'),
+                    Case(*((summary_move.id == i, n)
+                        for i, n in numbers.items())).as_('number'),
+                    where=summary_move.id.in_(list(numbers))))
+        if not queries:
+            return
+        elif len(queries) == 1:
+            return queries[0]
+        return Union(*queries, all_=True)
+
+    def _renumber(self):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        Sequence = pool.get('ir.sequence')
+        GeneralJournal = pool.get(
+            'account.summary.move.general_journal_pdf', type='report')
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        first_number = self.start.first_number
+        sequences = self._get_renumber_sequences()
+        counts = {}
+        numbers = {}
+        for sequence, periods in sequences.items():
+            query = self._get_renumber_query(sequence, periods)
+            if sequence.type == 'incremental':
+                cursor.execute(*summary_move.update(
+                        [summary_move.post_number,
+                            summary_move.write_uid, summary_move.write_date],
+                        [query.number,
+                            Transaction().user, CurrentTimestamp()],
+                        from_=[query],
+                        where=summary_move.id == query.id))
+                counts[sequence] = cursor.rowcount
+            else:
+                cursor.execute(*query.select(query.id,
+                        order_by=[query.date.asc, query.id.asc]))
+                move_ids = [i for i, in cursor]
+                numbers.update(zip(move_ids, sequence.get_many(len(move_ids))))
+
+        special_numbers, number_next = self._get_renumber_special_numbers(
+            counts)
+        numbers.update(special_numbers)
+        moves = self._get_renumber_special_moves()
+        first_move = self._get_renumber_first_move()
+        if first_move:
+            moves.insert(0, first_move)
+        for move in moves:
+            if move.id not in special_numbers:
+                sequence = move.period.post_summary_move_sequence_used
+                numbers[move.id] = sequence.get()
+        SummaryMove._write_post_number(numbers)
+
+        # Move the sequences forward once
+        to_write = defaultdict(list)
+        for sequence in sequences:
+            to_write[number_next.get(sequence, first_number)].append(sequence)
+        args = []
+        for number, sequences in to_write.items():
+            args.extend((sequences, {'number_next': number}))
+        Sequence.write(*args)
+        GeneralJournal.invalidate_cache([self.start.fiscalyear])
+
     def transition_renumber(self):
         return 'end'
 
 
+_JournalMove = namedtuple('_JournalMove',
+    ['id', 'post_number', 'date', 'description', 'total_debit',
+        'total_credit', 'lines'])
+_JournalAccount = namedtuple('_JournalAccount',
+    ['id', 'code', 'name', 'rec_name'])
+_JournalLine = namedtuple('_JournalLine',
+    ['account', 'description', 'debit', 'credit'])
+
+
 class PrintSummaryGeneralJournalStart(ModelView):
     "General Journal (Summary Moves)"
     __name__ = 'account.print_summary_move_general_journal.start'
@@ -752,6 +2569,30 @@ class PrintSummaryGeneralJournalStart(ModelView):
     company = fields.Many2One('company.company', "Company", required=True)
     fiscalyear = fields.Many2One('account.fiscalyear', "Fiscal Year",
         domain=[('company', '=', Eval('company', -1))], required=True)
+    start_period = fields.Many2One('account.period', "Start Period",
+        domain=[
+            ('fiscalyear', '=', Eval('fiscalyear', -1)),
+            If(Eval('end_period'),
+                ('start_date', '<=', Eval('end_period_start_date')),
+                ()),
+            ])
+    end_period = fields.Many2One('account.period', "End Period",
+        domain=[
+            ('fiscalyear', '=', Eval('fiscalyear', -1)),
+            If(Eval('start_period'),
+                ('start_date', '>=', Eval('start_period_start_date')),
+                ()),
+            ])
+    start_period_start_date = fields.Function(
+        fields.Date("Start Period Start Date"),
+        'on_change_with_start_period_start_date')
+    end_period_start_date = fields.Function(
+        fields.Date("End Period Start Date"),
+        'on_change_with_end_period_start_date')
+    from_post_number = fields.Char("From Post Number")
+    to_post_number = fields.Char("To Post Number")
+    split_period = fields.Boolean("Split by Period",
+        help="Render each period in its own document.")
 
     @classmethod
     def default_company(cls):
@@ -762,6 +2603,23 @@ class PrintSummaryGeneralJournalStart(ModelView):
         if self.fiscalyear and self.fiscalyear.company != self.company:
             self.fiscalyear = None
 
+    @fields.depends('fiscalyear', 'start_period', 'end_period')
+    def on_change_fiscalyear(self):
+        for name in ['start_period', 'end_period']:
+            period = getattr(self, name)
+            if period and period.fiscalyear != self.fiscalyear:
+                setattr(self, name, None)
+
+    @fields.depends('start_period')
+    def on_change_with_start_period_start_date(self, name=None):
+        if self.start_period:
+            return self.start_period.start_date
+
+    @fields.depends('end_period')
+    def on_change_with_end_period_start_date(self, name=None):
+        if self.end_period:
+            return self.end_period.start_date
+
 
 class PrintSummaryGeneralJournal(Wizard):
     'General Journal (Summary Moves)'
@@ -771,51 +2629,348 @@ class PrintSummaryGeneralJournal(Wizard):
         'account_move_summary.'
         'print_summary_move_general_journal_start_view_form', [
             Button('Cancel', 'end', 'tryton-cancel'),
+            Button('Export CSV', 'export_csv', 'tryton-export'),
+            Button('Export JSONL', 'export_jsonl', 'tryton-export'),
             Button('Print XLS', 'print_xls', 'tryton-print'),
             Button('Print PDF', 'print_pdf', 'tryton-print', default=True),
             ])
+    export_csv = StateReport('account.summary.move.general_journal_export')
+    export_jsonl = StateReport('account.summary.move.general_journal_export')
     print_xls = StateReport('account.summary.move.general_journal_xls')
     print_pdf = StateReport('account.summary.move.general_journal_pdf')
 
-    def do_print_xls(self, action):
-        data = {
-            'company': self.start.company.id,
-            'fiscalyear': (self.start.fiscalyear and
-                self.start.fiscalyear.id or None),
-            }
+    def do_export_csv(self, action):
+        data = self._get_data()
+        data['format'] = 'csv'
+        return action, data
+
+    def do_export_jsonl(self, action):
+        data = self._get_data()
+        data['format'] = 'jsonl'
         return action, data
 
+    def do_print_xls(self, action):
+        return action, self._get_data()
+
     def do_print_pdf(self, action):
+        return action, self._get_data()
+
+    def _get_data(self):
+        pool = Pool()
+        Period = pool.get('account.period')
+
         data = {
             'company': self.start.company.id,
             'fiscalyear': (self.start.fiscalyear and
                 self.start.fiscalyear.id or None),
+            'from_post_number': self.start.from_post_number,
+            'to_post_number': self.start.to_post_number,
+            'split_period': self.start.split_period,
             }
-        return action, data
+        if self.start.start_period or self.start.end_period:
+            domain = [('fiscalyear', '=', self.start.fiscalyear.id)]
+            if self.start.start_period:
+                domain.append(('start_date', '>=',
+                        self.start.start_period.start_date))
+            if self.start.end_period:
+                domain.append(('start_date', '<=',
+                        self.start.end_period.start_date))
+            data['periods'] = [p.id for p in Period.search(domain)]
+        return data
 
 
 class SummaryGeneralJournalPDF(Report):
     __name__ = 'account.summary.move.general_journal_pdf'
+    _cache_prefix = 'summary_general_journal-'
+
+    @classmethod
+    def _execute(cls, records, header, data, action):
+        pool = Pool()
+        FiscalYear = pool.get('account.fiscalyear')
+
+        if records or not data.get('fiscalyear'):
+            return cls._render(records, header, data, action)
+        fiscalyear = FiscalYear(data['fiscalyear'])
+        name = cls._get_cache_name(data, action)
+        cached = cls._get_cache(fiscalyear, name)
+        if cached:
+            return cached
+        oext, content = cls._render(records, header, data, action)
+        cls._set_cache(fiscalyear, name, oext, content)
+        return oext, content
+
+    @classmethod
+    def _get_cache_name(cls, data, action):
+        '''
+        Return the name of the cached render of the data keyed by a
+        fingerprint of the posted moves
+        '''
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+        transaction = Transaction()
+        cursor = transaction.connection.cursor()
+
+        cursor.execute(*summary_move.select(
+                Count(Literal('*')),
+                Max(Coalesce(
+                        summary_move.write_date, summary_move.create_date)),
+                where=cls._get_moves_where(summary_move, [], data)))
+        count, write_date = cursor.fetchone()
+        key = [
+            data.get('company', transaction.context.get('company')),
+            data['fiscalyear'], action.id, action.write_date,
+            transaction.language,
+            ] + [data.get(k) for k in [
+                'periods', 'from_post_number', 'to_post_number',
+                'split_period']] + [count, write_date]
+        digest = hashlib.sha256(
+            json.dumps(key, default=str).encode('utf-8')).hexdigest()
+        return cls._cache_prefix + digest
+
+    @classmethod
+    @without_check_access
+    def _get_cache(cls, fiscalyear, name):
+        pool = Pool()
+        Attachment = pool.get('ir.attachment')
+        attachments = Attachment.search([
+                ('resource', '=', str(fiscalyear)),
+                ('name', 'like', name + '.%'),
+                ], limit=1)
+        if attachments:
+            attachment, = attachments
+            return attachment.name.rsplit('.', 1)[1], attachment.data
+
+    @classmethod
+    def _set_cache(cls, fiscalyear, name, oext, content):
+        pool = Pool()
+        Attachment = pool.get('ir.attachment')
+        transaction = Transaction()
+
+        @without_check_access
+        def create():
+            Attachment.create([{
+                        'resource': str(fiscalyear),
+                        'name': '%s.%s' % (name, oext),
+                        'type': 'data',
+                        'data': content,
+                        }])
+        # The reports are executed by read-only transactions
+        if transaction.readonly:
+            with transaction.new_transaction():
+                create()
+        else:
+            create()
+
+    @classmethod
+    @without_check_access
+    def invalidate_cache(cls, fiscalyears):
+        "Delete the cached renders of the fiscal years"
+        pool = Pool()
+        Attachment = pool.get('ir.attachment')
+        if not fiscalyears:
+            return
+        Attachment.delete(Attachment.search([
+                    ('resource', 'in', [str(f) for f in fiscalyears]),
+                    ('name', 'like', cls._cache_prefix + '%'),
+                    ]))
+
+    @classmethod
+    def _render(cls, records, header, data, action):
+        if records or not data.get('split_period'):
+            return super()._execute(records, header, data, action)
+
+        periods = cls._get_periods(data)
+        if not periods:
+            return super()._execute(records, header, data, action)
+        workers = config.getint(
+            'account_move_summary', 'report_workers', default=1)
+        if workers > 1 and len(periods) > 1:
+            transaction = Transaction()
+            database = transaction.database.name
+            # The rendering is done by processes as it is bound by the CPU
+            mpool = _get_report_pool(database, workers)
+            results = mpool.starmap(_execute_report_period, [
+                    (database, transaction.user,
+                        dict(transaction.context), cls.__name__, p,
+                        header, data, action.id)
+                    for p in periods])
+        else:
+            results = [cls._execute_period(p, header, data, action.id)
+                for p in periods]
+        if len(results) == 1:
+            return results[0][1:]
+
+        padding = len(str(len(results)))
+        content = BytesIO()
+        with zipfile.ZipFile(content, 'w') as content_zip:
+            for i, (name, oext, rcontent) in enumerate(results, 1):
+                filename = slugify(
+                    '-'.join([str(i).zfill(padding), name]))
+                content_zip.writestr('%s.%s' % (filename, oext), rcontent)
+        return 'zip', content.getvalue()
+
+    @classmethod
+    def _execute_period(cls, period, header, data, action_id):
+        "Return the name, the extension and the content of the period chunk"
+        pool = Pool()
+        ActionReport = pool.get('ir.action.report')
+        Period = pool.get('account.period')
+
+        data = dict(data, periods=[period])
+        oext, content = super()._execute(
+            [], header, data, ActionReport(action_id))
+        return Period(period).rec_name, oext, content
+
+    @classmethod
+    def _get_periods(cls, data):
+        "Return the periods with moves ordered by their first post number"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        summary_move = SummaryMove.__table__()
+        cursor = Transaction().connection.cursor()
+
+        where = cls._get_moves_where(summary_move, [], data)
+        if where is None:
+            return []
+        cursor.execute(*summary_move.select(
+                summary_move.period,
+                where=where,
+                order_by=[
+                    CharLength(Coalesce(summary_move.post_number, '')),
+                    Coalesce(summary_move.post_number, ''),
+                    summary_move.date, summary_move.id]))
+        periods = {}
+        for period, in cursor:
+            periods.setdefault(period)
+        return list(periods)
 
     @classmethod
     def get_context(cls, records, header, data):
         pool = Pool()
         Company = pool.get('company.company')
-        SummaryMove = pool.get('account.summary.move')
 
-        if not records and 'fiscalyear' in data:
-            records = SummaryMove.search([
-                ('state', '=', 'posted'),
-                ('period.fiscalyear', '=', data['fiscalyear']),
-                ])
-        records = sorted(records, key=lambda i: (i.post_number or '', i.date))
         context = Transaction().context
         report_context = super().get_context(records, header, data)
+        records = cls.get_moves([r.id for r in records], data)
+        report_context['records'] = records
+        report_context['record'] = records[0] if records else None
         report_context['company'] = Company(
             data.get('company', context['company']))
         report_context['get_total_move'] = cls.get_total_move
         return report_context
 
+    @classmethod
+    def _get_moves_where(cls, summary_move, ids, data):
+        '''
+        Return the where clause of the moves from the ids or the posted moves
+        of the fiscal year, restricted to the periods and the range of post
+        numbers of the data
+        '''
+        pool = Pool()
+        Period = pool.get('account.period')
+        period = Period.__table__()
+
+        if ids:
+            where = reduce_ids(summary_move.id, ids)
+        elif data.get('fiscalyear') is not None:
+            where = ((summary_move.state == 'posted')
+                & summary_move.period.in_(period.select(
+                        period.id,
+                        where=period.fiscalyear == data['fiscalyear'])))
+        else:
+            return
+        if data.get('periods'):
+            where &= summary_move.period.in_(data['periods'])
+
+        # Compare the post numbers like the order by length and value
+        length = CharLength(summary_move.post_number)
+        if data.get('from_post_number'):
+            number = data['from_post_number']
+            where &= ((length > len(number))
+                | ((length == len(number))
+                    & (summary_move.post_number >= number)))
+        if data.get('to_post_number'):
+            number = data['to_post_number']
+            where &= ((length < len(number))
+                | ((length == len(number))
+                    & (summary_move.post_number <= number)))
+        return where
+
+    @classmethod
+    def _get_lines_query(cls, ids, data):
+        '''
+        Return the query of the lines of the moves ordered by post number
+        '''
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        SummaryLine = pool.get('account.summary.move.line')
+        Account = pool.get('account.account')
+        summary_move = SummaryMove.__table__()
+        summary_line = SummaryLine.__table__()
+        account = Account.__table__()
+
+        where = cls._get_moves_where(summary_move, ids, data)
+        if where is None:
+            return
+        return summary_move.join(summary_line, 'LEFT',
+            condition=summary_line.move == summary_move.id
+            ).join(account, 'LEFT',
+            condition=summary_line.account == account.id
+            ).select(
+            summary_move.id.as_('move'),
+            summary_move.number.as_('number'),
+            summary_move.post_number.as_('post_number'),
+            summary_move.date.as_('date'),
+            summary_move.description.as_('description'),
+            summary_move.total_debit.as_('total_debit'),
+            summary_move.total_credit.as_('total_credit'),
+            account.id.as_('account'),
+            account.code.as_('account_code'),
+            account.name.as_('account_name'),
+            summary_line.description.as_('line_description'),
+            summary_line.debit.as_('debit'),
+            summary_line.credit.as_('credit'),
+            where=where,
+            order_by=[
+                CharLength(Coalesce(summary_move.post_number, '')),
+                Coalesce(summary_move.post_number, ''),
+                summary_move.date, summary_move.id,
+                summary_line.id])
+
+    @classmethod
+    def get_moves(cls, ids, data):
+        '''
+        Return the rows of the moves with their lines ordered by post number
+        using the ids or the posted moves of the fiscal year of the data
+        '''
+        cursor = Transaction().connection.cursor()
+
+        query = cls._get_lines_query(ids, data)
+        if query is None:
+            return []
+        cursor.execute(*query)
+        moves = {}
+        accounts = {}
+        for (move_id, _, post_number, date, description,
+                total_debit, total_credit, account_id, code, name,
+                line_description, debit, credit) in cursor:
+            move = moves.get(move_id)
+            if move is None:
+                move = moves[move_id] = _JournalMove(
+                    move_id, post_number, date, description,
+                    Decimal(str(total_debit)), Decimal(str(total_credit)), [])
+            if account_id is None:
+                continue
+            account = accounts.get(account_id)
+            if account is None:
+                account = accounts[account_id] = _JournalAccount(
+                    account_id, code, name,
+                    code + ' - ' + name if code else name)
+            move.lines.append(_JournalLine(account, line_description,
+                    Decimal(str(debit)), Decimal(str(credit))))
+        return list(moves.values())
+
     @classmethod
     def get_total_move(self, lines, type_):
         if type_ == 'debit':
@@ -826,3 +2981,76 @@ class SummaryGeneralJournalPDF(Report):
 
 class SummaryGeneralJournalXLS(SummaryGeneralJournalPDF):
     __name__ = 'account.summary.move.general_journal_xls'
+
+
+class SummaryGeneralJournalExport(Report):
+    __name__ = 'account.summary.move.general_journal_export'
+
+    _columns = [
+        'post_number', 'number', 'date', 'description',
+        'account_code', 'account_name', 'line_description', 'debit', 'credit',
+        ]
+    _formats = ['csv', 'jsonl']
+    # The size above which the export is written to a temporary file
+    _spool_size = 8 * 1024 * 1024
+
+    @classmethod
+    def _execute(cls, records, header, data, action):
+        pool = Pool()
+        Company = pool.get('company.company')
+
+        format_ = data.get('format', 'csv')
+        company = Company(
+            data.get('company', Transaction().context['company']))
+        with tempfile.SpooledTemporaryFile(
+                max_size=cls._spool_size) as content:
+            cls.export(content, [r.id for r in records], data,
+                format_=format_, digits=company.currency.digits)
+            content.seek(0)
+            return format_, content.read()
+
+    @classmethod
+    def export(cls, file, ids, data, format_='csv', digits=2):
+        '''
+        Write the lines of the moves as CSV or JSON Lines to the binary file
+        reading them by batch from a server-side cursor
+        '''
+        assert format_ in cls._formats
+        query = SummaryGeneralJournalPDF._get_lines_query(ids, data)
+        exp = Decimal(1).scaleb(-digits)
+        # Unlike TextIOWrapper, the writer supports any binary file and does
+        # not close it
+        text = codecs.getwriter('utf-8')(file)
+        if format_ == 'csv':
+            writer = csv.writer(text)
+            writer.writerow(cls._columns)
+        if query is None:
+            return
+        with server_cursor('summary_general_journal_export') as cursor:
+            cursor.execute(*query)
+            while True:
+                rows = cursor.fetchmany(cursor.arraysize)
+                if not rows:
+                    break
+                for row in rows:
+                    row = cls._get_export_row(row, exp)
+                    if row is None:
+                        continue
+                    if format_ == 'csv':
+                        writer.writerow(row)
+                    else:
+                        text.write(json.dumps(dict(zip(cls._columns, row))))
+                        text.write('\n')
+
+    @classmethod
+    def _get_export_row(cls, row, exp):
+        (_, number, post_number, date, description, _, _,
+            account_id, code, name, line_description, debit, credit) = row
+        if account_id is None:
+            return
+        return [
+            post_number, number, date.isoformat(), description,
+            code, name, line_description,
+            str(Decimal(str(debit)).quantize(exp)),
+            str(Decimal(str(credit)).quantize(exp)),
+            ]
@@ -0,0 +1,240 @@
+# This file is part of Tryton.  The COPYRIGHT file at the top level of
+# this repository contains the full copyright notices and license terms.
+"""Benchmark the summaries on a synthetic ledger
+
+The database is configured like for the tests, for example:
+
+    DB_NAME=:memory: TRYTOND_DATABASE_URI=sqlite:// \\
+        python -m trytond.modules.account_move_summary.tests.benchmark
+
+The timings are written as JSON and the transaction is rolled back.
+"""
+import argparse
+import datetime as dt
+import json
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from sql import Cast
+from sql.operators import Concat
+
+from trytond import __version__, backend
+from trytond.modules.account.tests import create_chart
+from trytond.modules.company.tests import create_company, set_company
+from trytond.pool import Pool
+from trytond.tests.test_tryton import activate_module, with_transaction
+from trytond.tools import grouped_slice
+from trytond.transaction import Transaction
+
+from .test_module import create_summary_fiscalyear
+
+
+def create_ledger(fiscalyear, periods, journals, moves, lines, origins):
+    """Create and post a synthetic ledger
+
+    Each journal of the periods has moves with lines, one of which balances
+    the others. The origins is the ratio of moves with an invoice origin.
+    The moves are posted with SQL as only their state matters so their
+    balances are rebuilt.
+    """
+    pool = Pool()
+    Account = pool.get('account.account')
+    Journal = pool.get('account.journal')
+    Move = pool.get('account.move')
+    SummaryBalance = pool.get('account.summary.balance')
+    move = Move.__table__()
+    cursor = Transaction().connection.cursor()
+
+    expense, = Account.search([('type.expense', '=', True)])
+    revenue, = Account.search([('type.revenue', '=', True)])
+    journals = Journal.create([{
+                'name': 'Journal %s' % i,
+                'code': 'J%s' % i,
+                'type': 'general',
+                } for i in range(1, journals + 1)])
+    # The invoice model may not be activated
+    if 'account.invoice' in dict(Move.get_origin()):
+        origin_model = 'account.invoice'
+    else:
+        origin_model = 'account.move'
+
+    for period in fiscalyear.periods[:periods]:
+        for journal in journals:
+            vlist = []
+            for i in range(moves):
+                amounts = [
+                    Decimal(j % 10 + 1) for j in range(i, i + lines - 1)]
+                move_lines = [{
+                        'account': expense.id,
+                        'debit': a,
+                        'credit': Decimal(0),
+                        } for a in amounts]
+                move_lines.append({
+                        'account': revenue.id,
+                        'debit': Decimal(0),
+                        'credit': sum(amounts),
+                        })
+                vlist.append({
+                        'period': period.id,
+                        'journal': journal.id,
+                        'date': period.start_date,
+                        'description': 'Move %s' % i,
+                        'lines': [('create', move_lines)],
+                        })
+            records = Move.create(vlist)
+            ids = [m.id for m in records]
+            with_origin = ids[:int(len(ids) * origins)]
+            for sub_ids in grouped_slice(with_origin):
+                cursor.execute(*move.update(
+                        [move.origin],
+                        [Concat(origin_model + ',', Cast(move.id, 'VARCHAR'))],
+                        where=move.id.in_(list(sub_ids))))
+            for sub_ids in grouped_slice(ids):
+                cursor.execute(*move.update(
+                        [move.state, move.post_date],
+                        ['posted', period.start_date],
+                        where=move.id.in_(list(sub_ids))))
+    SummaryBalance.rebuild()
+
+
+def drop_summary_indexes():
+    "Drop the indexes which the module declares for the summaries"
+    pool = Pool()
+    for name in [
+            'account.move',
+            'account.summary.move',
+            'account.summary.move.line',
+            ]:
+        Model = pool.get(name)
+        indexes = Model._sql_indexes
+        Model._sql_indexes = indexes - Model._summary_sql_indexes()
+        try:
+            Model._update_sql_indexes()
+        finally:
+            Model._sql_indexes = indexes
+
+
+@contextmanager
+def timer(timings, name):
+    start = time.perf_counter()
+    yield
+    timings[name] = round(time.perf_counter() - start, 6)
+
+
+@with_transaction()
+def run(args):
+    pool = Pool()
+    Summary = pool.get('account.summary')
+    SummaryMove = pool.get('account.summary.move')
+    SummaryMoveLine = pool.get('account.summary.move.line')
+    Move = pool.get('account.move')
+    Line = pool.get('account.move.line')
+    Renumber = pool.get('account.summary.move.renumber', type='wizard')
+    ReportPDF = pool.get(
+        'account.summary.move.general_journal_pdf', type='report')
+    ReportXLS = pool.get(
+        'account.summary.move.general_journal_xls', type='report')
+
+    timings = {}
+    if args.without_indexes:
+        drop_summary_indexes()
+    company = create_company()
+    with set_company(company):
+        fiscalyear = create_summary_fiscalyear(company)
+        create_chart(company)
+        with timer(timings, 'ledger'):
+            create_ledger(fiscalyear, args.periods, args.journals, args.moves,
+                args.lines, args.origins)
+        # Let the planner know the size of the ledger
+        Transaction().connection.cursor().execute('ANALYZE')
+        summary = Summary(
+            name='Benchmark', summary_type=args.summary_type,
+            periods=fiscalyear.periods[:args.periods])
+        summary.save()
+
+        with timer(timings, 'compute'):
+            Summary.compute([summary])
+        with timer(timings, 'draft'):
+            Summary.draft([summary])
+        Summary.compute([summary])
+        with timer(timings, 'post'):
+            Summary.post([summary])
+
+        session_id, _, _ = Renumber.create()
+        with timer(timings, 'renumber'):
+            Renumber.execute(session_id, {
+                    'start': {
+                        'fiscalyear': fiscalyear.id,
+                        'first_number': 1,
+                        'first_move': None,
+                        'last_1_move': None,
+                        'last_2_move': None,
+                        'last_3_move': None,
+                        },
+                    }, 'renumber')
+        Renumber.delete(session_id)
+
+        data = {
+            'company': company.id,
+            'fiscalyear': fiscalyear.id,
+            }
+        with timer(timings, 'report_pdf'):
+            ReportPDF.execute([], data)
+        with timer(timings, 'report_xls'):
+            ReportXLS.execute([], data)
+
+        counts = {
+            'moves': Move.search([], count=True),
+            'lines': Line.search([], count=True),
+            'summary_moves': SummaryMove.search([], count=True),
+            'summary_lines': SummaryMoveLine.search([], count=True),
+            }
+    return counts, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the summaries on a synthetic ledger")
+    parser.add_argument('--periods', type=int, default=1,
+        help="the number of periods of the ledger (at most 12)")
+    parser.add_argument('--journals', type=int, default=2,
+        help="the number of journals of the ledger")
+    parser.add_argument('--moves', type=int, default=500,
+        help="the number of moves per period and journal")
+    parser.add_argument('--lines', type=int, default=2,
+        help="the number of lines per move (at least 2)")
+    parser.add_argument('--origins', type=float, default=0.5,
+        help="the ratio of moves with an invoice origin")
+    parser.add_argument('--summary-type', default='all_moves',
+        choices=['purchases_and_sales', 'all_moves'])
+    parser.add_argument('--without-indexes', action='store_true',
+        help="drop the indexes of the module to measure their effect")
+    parser.add_argument('--output', type=argparse.FileType('w'),
+        default=sys.stdout, help="the file to write the results")
+    args = parser.parse_args(argv)
+    if not 1 <= args.periods <= 12:
+        parser.error("periods must be between 1 and 12")
+    if args.lines < 2:
+        parser.error("lines must be at least 2")
+
+    activate_module('account_move_summary')
+    counts, timings = run(args)
+
+    json.dump({
+            'date': dt.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'trytond': __version__,
+            'backend': backend.name,
+            'parameters': {
+                k: v for k, v in vars(args).items() if k != 'output'},
+            'counts': counts,
+            'timings': timings,
+            }, args.output, indent=2)
+    args.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,1110 @@
 # This file is part of Tryton.  The COPYRIGHT file at the top level of
 # this repository contains the full copyright notices and license terms.
 
-from trytond.modules.company.tests import CompanyTestMixin
-from trytond.tests.test_tryton import ModuleTestCase
+import csv
+import datetime as dt
+import io
+import json
+import zipfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from sql import Literal, Null, Select
+from sql.aggregate import Sum
+
+from trytond.config import config
+from trytond.modules.account.tests import create_chart, get_fiscalyear
+from trytond.modules.company.tests import (
+    CompanyTestMixin, create_company, set_company)
+from trytond.pool import Pool
+from trytond.tests.test_tryton import ModuleTestCase, with_transaction
+from trytond.transaction import Transaction
+
+
+def create_summary_fiscalyear(company):
+    pool = Pool()
+    FiscalYear = pool.get('account.fiscalyear')
+    Sequence = pool.get('ir.sequence')
+
+    fiscalyear = get_fiscalyear(company)
+    sequence, = Sequence.copy([fiscalyear.post_move_sequence])
+    fiscalyear.post_summary_move_sequence = sequence
+    fiscalyear.save()
+    FiscalYear.create_period([fiscalyear])
+    return fiscalyear
+
+
+def create_moves(period, journal, accounts, count, origin=None):
+    "Create and post count moves with a line per account"
+    pool = Pool()
+    Move = pool.get('account.move')
+    Line = pool.get('account.move.line')
+    Party = pool.get('party.party')
+    SummaryBalance = pool.get('account.summary.balance')
+
+    party = Party(name='Party')
+    party.save()
+    (debit_account, credit_account) = accounts
+    moves = []
+    for i in range(1, count + 1):
+        moves.append(Move(
+                period=period, journal=journal, date=period.start_date,
+                description='Move %s' % i,
+                lines=[
+                    Line(account=debit_account, debit=Decimal(i),
+                        description='Debit %s' % i,
+                        party=party if debit_account.party_required
+                        else None),
+                    Line(account=credit_account, credit=Decimal(i),
+                        description='Credit %s' % i,
+                        party=party if credit_account.party_required
+                        else None),
+                    ]))
+    Move.save(moves)
+    Move.post(moves)
+    if origin:
+        # Use SQL as the origin model may not be activated
+        move = Move.__table__()
+        cursor = Transaction().connection.cursor()
+        cursor.execute(*move.update(
+                [move.origin], [Literal(origin)],
+                where=move.id.in_([m.id for m in moves])))
+        SummaryBalance.rebuild([period])
+    return moves
 
 
 class AccountMoveSummaryTestCase(CompanyTestMixin, ModuleTestCase):
     'Test account_move_summary module'
     module = 'account_move_summary'
 
+    def _create_ledger(self):
+        pool = Pool()
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+
+        fiscalyear = create_summary_fiscalyear(self.company)
+        create_chart(self.company)
+        period = fiscalyear.periods[0]
+        revenue, = Account.search([('type.revenue', '=', True)])
+        receivable, = Account.search([('type.receivable', '=', True)])
+        expense, = Account.search([('type.expense', '=', True)])
+        payable, = Account.search([('type.payable', '=', True)])
+        journal_revenue, = Journal.search([('code', '=', 'REV')])
+        journal_expense, = Journal.search([('code', '=', 'EXP')])
+
+        origin = str(fiscalyear)
+        create_moves(period, journal_revenue, (receivable, revenue), 3,
+            origin=origin)
+        moves = create_moves(period, journal_expense, (expense, payable), 2,
+            origin=origin)
+        create_moves(period, journal_expense, (expense, payable), 1,
+            origin=str(moves[0]))
+        create_moves(period, journal_revenue, (receivable, revenue), 2)
+        return fiscalyear, period
+
+    def _compute(self, summary_type, period):
+        pool = Pool()
+        Summary = pool.get('account.summary')
+
+        summary = Summary(name='Summary', summary_type=summary_type,
+            periods=[period])
+        summary.save()
+        Summary.compute([summary])
+        return summary
+
+    def _summary_moves(self, summary):
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        Move = pool.get('account.move')
+
+        result = []
+        for move in SummaryMove.search([('summary', '=', summary.id)]):
+            result.append((
+                    move.journal.code, move.description,
+                    Move.search([('summary_move', '=', move.id)], count=True),
+                    sorted((l.account.name, l.debit, l.credit, l.description,
+                            l.state)
+                        for l in move.lines)))
+        return sorted(result)
+
+    @with_transaction()
+    def test_compute_purchases_and_sales(self):
+        "Test compute purchases and sales summary"
+        pool = Pool()
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('purchases_and_sales', period)
+
+            self.assertEqual(summary.state, 'calculated')
+            moves = self._summary_moves(summary)
+            self.assertEqual(len(moves), 8)
+            self.assertEqual({m[2] for m in moves}, {1})
+            self.assertIn(
+                ('EXP', 'Move 1', 1, [
+                        ('Main Expense', Decimal(1), Decimal(0), 'Debit 1',
+                            'valid'),
+                        ('Main Payable', Decimal(0), Decimal(1), 'Credit 1',
+                            'valid'),
+                        ]), moves)
+            self.assertFalse(Move.search([
+                        ('period', '=', period.id),
+                        ('summary_move', '=', None),
+                        ]))
+
+    @with_transaction()
+    def test_compute_all_moves(self):
+        "Test compute all moves summary"
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+
+            moves = self._summary_moves(summary)
+            self.assertEqual(
+                [m[:3] for m in moves], [
+                    ('EXP', 'Account Move - Expense', 1),
+                    ('EXP', 'Fiscal Year - Expense', 2),
+                    ('REV', 'Fiscal Year - Revenue', 3),
+                    ('REV', 'Move 1', 1),
+                    ('REV', 'Move 2', 1),
+                    ])
+            self.assertEqual(moves[1][3], [
+                    ('Main Expense', Decimal(3), Decimal(0), 'Main Expense',
+                        'valid'),
+                    ('Main Payable', Decimal(0), Decimal(3), 'Main Payable',
+                        'valid'),
+                    ])
+            self.assertEqual(moves[4][3], [
+                    ('Main Receivable', Decimal(2), Decimal(0), 'Debit 2',
+                        'valid'),
+                    ('Main Revenue', Decimal(0), Decimal(2), 'Credit 2',
+                        'valid'),
+                    ])
+
+    @with_transaction()
+    def test_compute_chunk(self):
+        "Test compute summary by chunks of moves"
+        if not config.has_section('account_move_summary'):
+            config.add_section('account_move_summary')
+        config.set('account_move_summary', 'compute_chunk', '2')
+        self.addCleanup(
+            config.remove_option, 'account_move_summary', 'compute_chunk')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+
+            moves = self._summary_moves(summary)
+            self.assertEqual(len(moves), 5)
+            self.assertEqual(moves[2], (
+                    'REV', 'Fiscal Year - Revenue', 3, [
+                        ('Main Receivable', Decimal(6), Decimal(0),
+                            'Main Receivable', 'valid'),
+                        ('Main Revenue', Decimal(0), Decimal(6),
+                            'Main Revenue', 'valid'),
+                        ]))
+
+    @with_transaction()
+    def test_compute_parallel(self):
+        "Test compute summary with parallel tasks"
+        pool = Pool()
+        Queue = pool.get('ir.queue')
+        if not config.has_section('account_move_summary'):
+            config.add_section('account_move_summary')
+        for option in ['compute_parallel', 'compute_parallel_journal']:
+            config.set('account_move_summary', option, 'True')
+            self.addCleanup(
+                config.remove_option, 'account_move_summary', option)
+        transaction = Transaction()
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+
+            self.assertEqual(summary.state, 'running')
+            self.assertEqual((summary.tasks, summary.tasks_done), (2, 0))
+            # The tasks would create the moves again
+            summary.draft([summary])
+            self.assertEqual(summary.state, 'running')
+            while transaction.tasks:
+                Queue(transaction.tasks.pop(0)).run()
+
+            summary = summary.__class__(summary.id)
+            self.assertEqual(summary.state, 'calculated')
+            self.assertEqual(summary.tasks_done, 2)
+            self.assertEqual(summary.moves_done, 8)
+            moves = self._summary_moves(summary)
+            self.assertEqual(len(moves), 5)
+            self.assertEqual({l[4] for m in moves for l in m[3]}, {'valid'})
+
+            self.assertTrue(summary.runs)
+            copy, = summary.copy([summary])
+            self.assertEqual(copy.state, 'draft')
+            self.assertEqual(copy.runs, ())
+            self.assertEqual(
+                (copy.tasks, copy.tasks_done, copy.moves_done),
+                (None, None, None))
+            self.assertEqual(len(self._summary_moves(copy)), 0)
+
+            summary.draft([summary])
+            self.assertEqual(
+                (summary.tasks, summary.tasks_done, summary.moves_done),
+                (None, None, None))
+
+    @with_transaction()
+    def test_compute_claimed(self):
+        "Test compute summary skips the moves claimed by another computation"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        Journal = pool.get('account.journal')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            journal_revenue, = Journal.search([('code', '=', 'REV')])
+            claimed, = Move.search([
+                    ('journal', '=', journal_revenue.id),
+                    ('description', '=', 'Move 1'),
+                    ('origin', '!=', None),
+                    ])
+
+            # Simulate the lock of the move by another transaction
+            get_claim = Summary._get_summary_group_claim
+            get_chunk = Summary._get_summary_chunk
+
+            def get_summary_group_claim(self, period):
+                query = get_claim(self, period)
+                query.where &= query.from_[0].id != claimed.id
+                return query
+
+            def get_summary_chunk(self, *args, **kwargs):
+                return [i for i in get_chunk(self, *args, **kwargs)
+                    if i != claimed.id]
+
+            summary = Summary(name='Summary', summary_type='all_moves',
+                periods=[period])
+            summary.save()
+            with patch.object(Summary, '_get_summary_group_claim',
+                    get_summary_group_claim), \
+                    patch.object(Summary, '_get_summary_chunk',
+                        get_summary_chunk), \
+                    self.assertNoLogs(
+                        'trytond.modules.account_move_summary.move',
+                        'WARNING'):
+                self.assertFalse(summary._check_summary_balances(period))
+                Summary.compute([summary])
+            self.assertIsNone(Move(claimed.id).summary_move)
+            self.assertEqual(
+                Move.search([('summary_move', '!=', None)], count=True), 7)
+
+            Summary.refresh([summary])
+            self.assertIsNotNone(Move(claimed.id).summary_move)
+            self.assertEqual(
+                sum(m[2] for m in self._summary_moves(summary)), 8)
+
+    @with_transaction()
+    def test_compute_grouping(self):
+        "Test compute summaries with grouping options"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+
+            summary = Summary(name='Summary', summary_type='all_moves',
+                periods=[period], group_single_moves=True)
+            summary.save()
+            Summary.compute([summary])
+            self.assertEqual(
+                [m[:3] for m in self._summary_moves(summary)], [
+                    ('EXP', 'Account Move - Expense', 1),
+                    ('EXP', 'Fiscal Year - Expense', 2),
+                    ('REV', 'Fiscal Year - Revenue', 3),
+                    ('REV', 'Revenue', 2),
+                    ])
+            Summary.draft([summary])
+
+            summary.group_origin = False
+            summary.group_date = 'week'
+            summary.save()
+            Summary.compute([summary])
+            moves = self._summary_moves(summary)
+            self.assertEqual(
+                [m[:3] for m in moves],
+                [('EXP', 'Expense', 3), ('REV', 'Revenue', 5)])
+            self.assertEqual(moves[1][3], [
+                    ('Main Receivable', Decimal(9), Decimal(0),
+                        'Main Receivable', 'valid'),
+                    ('Main Revenue', Decimal(0), Decimal(9),
+                        'Main Revenue', 'valid'),
+                    ])
+            start = period.start_date
+            end_week = start + dt.timedelta(days=6 - start.weekday())
+            self.assertEqual(
+                {m.date for m in SummaryMove.search([])},
+                {min(end_week, period.end_date)})
+            Summary.draft([summary])
+
+            summary.group_date = 'day'
+            summary.group_party = True
+            summary.save()
+            Summary.compute([summary])
+            moves = self._summary_moves(summary)
+            self.assertEqual(
+                [m[:3] for m in moves], [
+                    ('EXP', 'Expense - Party', 1),
+                    ('EXP', 'Expense - Party', 2),
+                    ('REV', 'Revenue - Party', 2),
+                    ('REV', 'Revenue - Party', 3),
+                    ])
+            self.assertEqual(
+                {m.date for m in SummaryMove.search([])}, {start})
+            self.assertFalse(Move.search([
+                        ('period', '=', period.id),
+                        ('summary_move', '=', None),
+                        ]))
+
+    @with_transaction()
+    def test_compute_journals(self):
+        "Test compute summaries of disjoint journals of the same period"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        Journal = pool.get('account.journal')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summaries = Summary.create([{
+                        'name': code,
+                        'summary_type': 'all_moves',
+                        'periods': [('add', [period.id])],
+                        'journals': [('add', [j.id for j in Journal.search([
+                                            ('code', '=', code),
+                                            ])])],
+                        } for code in ['REV', 'EXP']])
+            Summary.compute(summaries)
+
+            revenue, expense = [self._summary_moves(s) for s in summaries]
+            self.assertEqual({m[0] for m in revenue}, {'REV'})
+            self.assertEqual({m[0] for m in expense}, {'EXP'})
+            self.assertEqual((len(revenue), len(expense)), (3, 2))
+            self.assertEqual(sum(m[2] for m in revenue + expense), 8)
+            self.assertFalse(Move.search([
+                        ('period', '=', period.id),
+                        ('summary_move', '=', None),
+                        ]))
+
+    @with_transaction()
+    def test_refresh(self):
+        "Test refresh summary with moves posted later"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+
+            # Fill the keys of the moves computed before they were stored
+            summary_moves = SummaryMove.search(
+                [('summary', '=', summary.id)])
+            keys = [m.group_key for m in summary_moves]
+            summary_move = SummaryMove.__table__()
+            cursor = Transaction().connection.cursor()
+            cursor.execute(*summary_move.update(
+                    [summary_move.group_key], [Null]))
+            SummaryMove._fill_group_keys(
+                summary_move, summary_move.group_key == Null)
+            self.assertEqual(
+                [m.group_key for m in SummaryMove.browse(summary_moves)],
+                keys)
+
+            expense_move, = SummaryMove.search([
+                    ('summary', '=', summary.id),
+                    ('description', '=', 'Account Move - Expense'),
+                    ])
+            write_date = expense_move.write_date
+
+            revenue, = Account.search([('type.revenue', '=', True)])
+            receivable, = Account.search([('type.receivable', '=', True)])
+            journal_revenue, = Journal.search([('code', '=', 'REV')])
+            create_moves(period, journal_revenue, (receivable, revenue), 2,
+                origin=str(fiscalyear))
+            Summary.refresh([summary])
+
+            self.assertEqual(summary.state, 'calculated')
+            self.assertFalse(Move.search([
+                        ('period', '=', period.id),
+                        ('summary_move', '=', None),
+                        ]))
+            moves = self._summary_moves(summary)
+            self.assertEqual(len(moves), 5)
+            self.assertEqual(moves[2], (
+                    'REV', 'Fiscal Year - Revenue', 5, [
+                        ('Main Receivable', Decimal(9), Decimal(0),
+                            'Main Receivable', 'valid'),
+                        ('Main Revenue', Decimal(0), Decimal(9),
+                            'Main Revenue', 'valid'),
+                        ]))
+            self.assertEqual(
+                SummaryMove(expense_move.id).write_date, write_date)
+
+    def _balances(self):
+        pool = Pool()
+        SummaryBalance = pool.get('account.summary.balance')
+        balance = SummaryBalance.__table__()
+        cursor = Transaction().connection.cursor()
+
+        columns = [balance.journal, balance.origin, balance.account]
+        cursor.execute(*balance.select(*columns,
+                Sum(balance.debit), Sum(balance.credit), Sum(balance.moves),
+                group_by=columns, having=Sum(balance.moves) != 0))
+        return sorted((
+                (j, o, a, Decimal(str(d)), Decimal(str(c)), m)
+                for j, o, a, d, c, m in cursor),
+            key=lambda b: (b[0], b[1] or '', b[2]))
+
+    @with_transaction()
+    def test_balances(self):
+        "Test balances of moves not yet summarized"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        SummaryBalance = pool.get('account.summary.balance')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            journal_revenue, = Journal.search([('code', '=', 'REV')])
+            receivable, = Account.search([('type.receivable', '=', True)])
+            balances = self._balances()
+            self.assertEqual(len(balances), 8)
+            self.assertIn(
+                (journal_revenue.id, 'account.fiscalyear', receivable.id,
+                    Decimal(6), Decimal(0), 3), balances)
+            self.assertIn(
+                (journal_revenue.id, None, receivable.id,
+                    Decimal(3), Decimal(0), 2), balances)
+
+            summary = self._compute('all_moves', period)
+            self.assertEqual(self._balances(), [])
+            self.assertEqual(SummaryBalance.search([], count=True), 0)
+
+            Summary.draft([summary])
+            self.assertEqual(self._balances(), balances)
+            SummaryBalance.rebuild()
+            self.assertEqual(self._balances(), balances)
+
+            Summary.compute([summary])
+            move, = Move.search([
+                    ('journal', '=', journal_revenue.id),
+                    ('description', '=', 'Move 1'),
+                    ('origin', '=', None),
+                    ])
+            cancel_move = move.cancel()
+            Move.post([cancel_move])
+            self.assertEqual(
+                sorted((b[1], b[3], b[4], b[5]) for b in self._balances()), [
+                    ('account.move', Decimal(-1), Decimal(0), 1),
+                    ('account.move', Decimal(0), Decimal(-1), 1),
+                    ])
+
+            SummaryMove.delete(
+                SummaryMove.search([('summary', '=', summary.id)]))
+            self.assertFalse(Move.search([('summary_move', '!=', None)]))
+            balances = self._balances()
+            self.assertEqual(len(balances), 10)
+            SummaryBalance.rebuild()
+            self.assertEqual(self._balances(), balances)
+
+    @with_transaction()
+    def test_balances_compact(self):
+        "Test compact balances with many rows by key"
+        pool = Pool()
+        SummaryBalance = pool.get('account.summary.balance')
+        Move = pool.get('account.move')
+        move = Move.__table__()
+
+        self.company = create_company()
+        with set_company(self.company):
+            self._create_ledger()
+            balances = self._balances()
+            count = SummaryBalance.search([], count=True)
+
+            SummaryBalance._insert_moves(move, move.state == 'posted')
+            SummaryBalance._insert_moves(
+                move, move.state == 'posted', sign=-1)
+            self.assertEqual(
+                SummaryBalance.search([], count=True), count * 3)
+            SummaryBalance.compact_balances()
+            self.assertEqual(SummaryBalance.search([], count=True), count)
+            self.assertEqual(self._balances(), balances)
+
+    @with_transaction()
+    def test_balances_stale(self):
+        "Test compute summary with balances which do not match the moves"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryBalance = pool.get('account.summary.balance')
+        Journal = pool.get('account.journal')
+        balance = SummaryBalance.__table__()
+        cursor = Transaction().connection.cursor()
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            moves = self._summary_moves(summary)
+            Summary.draft([summary])
+
+            journal_revenue, = Journal.search([('code', '=', 'REV')])
+            cursor.execute(*balance.delete(
+                    where=balance.journal == journal_revenue.id))
+            with self.assertLogs(
+                    'trytond.modules.account_move_summary.move',
+                    'WARNING'):
+                Summary.compute([summary])
+            self.assertEqual(self._summary_moves(summary), moves)
+
+    @with_transaction()
+    def test_preview(self):
+        "Test preview summary without writing"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Account = pool.get('account.account')
+        Journal = pool.get('account.journal')
+        Move = pool.get('account.move')
+        Preview = pool.get('account.summary.preview', type='wizard')
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = Summary(name='Summary', summary_type='all_moves',
+                periods=[period])
+            summary.save()
+
+            preview = Summary.get_preview([summary])[summary.id]
+            self.assertEqual(
+                (preview['moves'], preview['summary_moves'],
+                    preview['summary_lines']), (8, 5, 10))
+            self.assertEqual(
+                sorted((Account(a['account']).name, a['debit'], a['credit'])
+                    for a in preview['accounts']), [
+                    ('Main Expense', Decimal(4), Decimal(0)),
+                    ('Main Payable', Decimal(0), Decimal(4)),
+                    ('Main Receivable', Decimal(9), Decimal(0)),
+                    ('Main Revenue', Decimal(0), Decimal(9)),
+                    ])
+            self.assertIn({
+                    'period': period.id,
+                    'journal': Journal.search([('code', '=', 'REV')])[0].id,
+                    'description': 'Fiscal Year - Revenue',
+                    'lines': 6,
+                    'debit': Decimal(6),
+                    'credit': Decimal(6),
+                    }, preview['groups'])
+            self.assertEqual(len(preview['groups']), 5)
+            self.assertFalse(SummaryMove.search([]))
+            self.assertEqual(
+                Move.search([('summary_move', '!=', None)], count=True), 0)
+
+            Summary.compute([summary])
+            self.assertEqual(SummaryMove.search([], count=True), 5)
+
+            revenue, = Account.search([('type.revenue', '=', True)])
+            receivable, = Account.search([('type.receivable', '=', True)])
+            journal_revenue, = Journal.search([('code', '=', 'REV')])
+            create_moves(period, journal_revenue, (receivable, revenue), 2,
+                origin=str(fiscalyear))
+            with Transaction().set_context(
+                    active_model='account.summary', active_id=summary.id,
+                    active_ids=[summary.id]):
+                session_id, _, _ = Preview.create()
+                result = Preview.execute(session_id, {}, 'show')
+            show = result['view']['defaults']
+            self.assertEqual(
+                (show['moves'], show['summary_moves'], show['summary_lines']),
+                (2, 0, 0))
+            self.assertEqual(
+                [(g['debit'], g['credit']) for g in show['groups']],
+                [(Decimal(3), Decimal(3))])
+
+    @with_transaction()
+    def test_validate_move(self):
+        "Test validate summary moves"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        SummaryMoveLine = pool.get('account.summary.move.line')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            move, = SummaryMove.search([
+                    ('summary', '=', summary.id),
+                    ('description', '=', 'Move 1'),
+                    ])
+            line = move.lines[0]
+            self.assertEqual(
+                (move.total_debit, move.total_credit), (Decimal(1),) * 2)
+
+            SummaryMoveLine.write([line], {'debit': line.debit + 1})
+            self.assertEqual(
+                move.total_debit, sum(l.debit for l in move.lines))
+            SummaryMove.validate_move([move])
+            self.assertEqual({l.state for l in move.lines}, {'draft'})
+
+            SummaryMoveLine.write([line], {'debit': line.debit - 1})
+            SummaryMove.validate_move([move])
+            self.assertEqual({l.state for l in move.lines}, {'valid'})
+
+            SummaryMoveLine.delete([line])
+            self.assertEqual(
+                (move.total_debit, move.total_credit),
+                (Decimal(0), Decimal(1)))
+
+    @with_transaction()
+    def test_line_move_fields(self):
+        "Test move fields of summary lines"
+        pool = Pool()
+        SummaryMove = pool.get('account.summary.move')
+        SummaryMoveLine = pool.get('account.summary.move.line')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            move, = SummaryMove.search([
+                    ('summary', '=', summary.id),
+                    ('description', '=', 'Move 1'),
+                    ])
+            lines = SummaryMoveLine.search([])
+
+            for line in lines:
+                self.assertEqual(
+                    (line.period, line.company, line.date,
+                        line.move_description, line.move_state),
+                    (period, self.company, period.end_date,
+                        line.move.description, 'draft'))
+                self.assertEqual(line.currency, self.company.currency)
+                self.assertEqual(line.amount_currency, self.company.currency)
+                sign = -1 if line.account.type.statement == 'income' else 1
+                self.assertEqual(
+                    line.amount, (line.debit - line.credit) * sign)
+
+            for domain, count in [
+                    ([('period', '=', period.id)], len(lines)),
+                    ([('company', '=', self.company.id)], len(lines)),
+                    ([('date', '=', period.end_date)], len(lines)),
+                    ([('move_description', '=', 'Move 1')], 2),
+                    ([('move_state', '=', 'posted')], 0),
+                    ]:
+                self.assertEqual(
+                    SummaryMoveLine.search(domain, count=True), count)
+            for order in ['period', 'company', 'date', 'move_description',
+                    'move_state']:
+                self.assertEqual(
+                    len(SummaryMoveLine.search([], order=[(order, 'ASC')])),
+                    len(lines))
+            self.assertEqual(
+                SummaryMoveLine.search(
+                    [('move_description', 'in', ['Move 1', 'Move 2'])],
+                    order=[('move_description', 'ASC'), ('id', 'ASC')],
+                    limit=2),
+                list(move.lines))
+
+    @with_transaction()
+    def test_sequence_get_many(self):
+        "Test reserve many sequence numbers"
+        pool = Pool()
+        Sequence = pool.get('ir.sequence')
+        SequenceStrict = pool.get('ir.sequence.strict')
+        SequenceType = pool.get('ir.sequence.type')
+
+        sequence_type, = SequenceType.search([], limit=1)
+        for Model in [Sequence, SequenceStrict]:
+            sequence = Model(name='Test', sequence_type=sequence_type,
+                prefix='P', padding=3, number_increment=2, number_next=5)
+            sequence.save()
+
+            self.assertEqual(sequence.get_many(0), [])
+            self.assertEqual(
+                sequence.get_many(3), ['P005', 'P007', 'P009'])
+            self.assertEqual(sequence.get(), 'P011')
+
+            cursor = Transaction().connection.cursor()
+            cursor.execute(*Select([
+                        sequence.format_number_sql(Literal(7)),
+                        sequence.format_number_sql(Literal(1234)),
+                        ]))
+            self.assertEqual(cursor.fetchone(), ('P007', 'P1234'))
+
+    @with_transaction()
+    def test_renumber(self):
+        "Test renumber summary moves"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Renumber = pool.get('account.summary.move.renumber', type='wizard')
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+            moves = SummaryMove.search(
+                [('summary', '=', summary.id)], order=[('id', 'ASC')])
+
+            start = {
+                'fiscalyear': fiscalyear.id,
+                'first_number': 2,
+                'first_move': moves[2].id,
+                'last_1_move': moves[0].id,
+                'last_2_move': None,
+                'last_3_move': None,
+                }
+            session_id, _, _ = Renumber.create()
+            result = Renumber.execute(session_id, {'start': start}, 'preview')
+            preview = result['view']['defaults']
+            self.assertEqual(preview['changed'], 4)
+            self.assertEqual(preview['first_change'], '1 → 5')
+            self.assertEqual(preview['last_change'], '5 → 4')
+            self.assertEqual(
+                [(l['move'], l['new_number']) for l in preview['lines']],
+                [(moves[0].id, '5'), (moves[2].id, '1'), (moves[3].id, '3'),
+                    (moves[4].id, '4')])
+            self.assertEqual(
+                [m.post_number for m in SummaryMove.browse(moves)],
+                ['1', '2', '3', '4', '5'])
+            self.assertEqual(
+                fiscalyear.post_summary_move_sequence.number_next, 6)
+
+            with patch.object(Renumber, '_preview_page_size', 3):
+                result = Renumber.execute(
+                    session_id, {'start': start}, 'preview')
+                preview = result['view']['defaults']
+                self.assertEqual(
+                    (preview['page'], preview['pages'], len(preview['lines'])),
+                    (0, 2, 3))
+                result = Renumber.execute(
+                    session_id, {'preview': {}}, 'preview_next')
+                preview = result['view']['defaults']
+                self.assertEqual(
+                    (preview['page'], [l['move'] for l in preview['lines']]),
+                    (1, [moves[4].id]))
+                result = Renumber.execute(
+                    session_id, {'preview': {}}, 'preview_next')
+                self.assertEqual(result['view']['defaults']['page'], 1)
+                result = Renumber.execute(
+                    session_id, {'preview': {}}, 'preview_previous')
+                self.assertEqual(result['view']['defaults']['page'], 0)
+
+            Renumber.execute(session_id, {'start': start}, 'renumber')
+
+            self.assertEqual(
+                [m.post_number for m in SummaryMove.browse(moves)],
+                ['5', '2', '1', '3', '4'])
+            self.assertEqual(
+                fiscalyear.post_summary_move_sequence.number_next, 6)
+
+            # The first move is numbered only if it has a post number
+            SummaryMove.write([moves[2]], {'post_number': None})
+            session_id, _, _ = Renumber.create()
+            Renumber.execute(session_id, {'start': start}, 'renumber')
+
+            self.assertEqual(
+                [m.post_number for m in SummaryMove.browse(moves)],
+                ['5', '2', None, '3', '4'])
+            self.assertEqual(
+                fiscalyear.post_summary_move_sequence.number_next, 6)
+
+    @with_transaction()
+    def test_general_journal_moves(self):
+        "Test rows of general journal report"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Report = pool.get(
+            'account.summary.move.general_journal_pdf', type='report')
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+            moves = SummaryMove.search(
+                [('summary', '=', summary.id)], order=[('id', 'ASC')])
+            SummaryMove._write_post_number({
+                    moves[0].id: '10',
+                    moves[1].id: '9',
+                    })
+
+            rows = Report.get_moves([], {'fiscalyear': fiscalyear.id})
+            self.assertEqual(
+                [r.post_number for r in rows], ['3', '4', '5', '9', '10'])
+            for row, move in zip(rows, SummaryMove.browse(
+                        [r.id for r in rows])):
+                self.assertEqual(row.date, move.date)
+                self.assertEqual(
+                    [(l.account.rec_name, l.description, l.debit, l.credit)
+                        for l in row.lines],
+                    [(l.account.rec_name, l.description, l.debit, l.credit)
+                        for l in move.lines])
+            self.assertEqual(
+                [r.id for r in Report.get_moves(
+                        [moves[1].id, moves[3].id], {})],
+                [moves[3].id, moves[1].id])
+            rows = Report.get_moves([], {
+                    'fiscalyear': fiscalyear.id,
+                    'from_post_number': '4',
+                    'to_post_number': '9',
+                    })
+            self.assertEqual([r.post_number for r in rows], ['4', '5', '9'])
+
+            # Move the last numbers to the next period
+            next_period = fiscalyear.periods[1]
+            summary_move = SummaryMove.__table__()
+            cursor = Transaction().connection.cursor()
+            cursor.execute(*summary_move.update(
+                    [summary_move.period], [next_period.id],
+                    where=summary_move.id.in_([moves[0].id, moves[1].id])))
+            data = {'fiscalyear': fiscalyear.id, 'split_period': True}
+            self.assertEqual(
+                Report._get_periods(data), [period.id, next_period.id])
+            self.assertEqual(
+                [r.post_number for r in Report.get_moves([], dict(data,
+                            periods=[next_period.id]))],
+                ['9', '10'])
+            oext, content, _, _ = Report.execute([], data)
+            self.assertEqual(oext, 'zip')
+            with zipfile.ZipFile(io.BytesIO(content)) as content_zip:
+                self.assertEqual(len(content_zip.namelist()), 2)
+
+    @with_transaction()
+    def test_general_journal_cache(self):
+        "Test cache of rendered general journal"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        Attachment = pool.get('ir.attachment')
+        Queue = pool.get('ir.queue')
+        Report = pool.get(
+            'account.summary.move.general_journal_pdf', type='report')
+        Renumber = pool.get('account.summary.move.renumber', type='wizard')
+        if not config.has_section('account_move_summary'):
+            config.add_section('account_move_summary')
+        config.set('account_move_summary', 'report_prerender', 'True')
+        self.addCleanup(
+            config.remove_option, 'account_move_summary', 'report_prerender')
+        transaction = Transaction()
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+            while transaction.tasks:
+                Queue(transaction.tasks.pop(0)).run()
+
+            def cached():
+                return Attachment.search([
+                        ('resource', '=', str(fiscalyear)),
+                        ('name', 'like', Report._cache_prefix + '%'),
+                        ])
+            self.assertEqual(len(cached()), 2)
+
+            data = {'fiscalyear': fiscalyear.id}
+            oext, content, _, _ = Report.execute([], data)
+            self.assertIn(content, [a.data for a in cached()])
+            self.assertEqual(len(cached()), 2)
+
+            Report.execute([], dict(data, to_post_number='2'))
+            self.assertEqual(len(cached()), 3)
+
+            session_id, _, _ = Renumber.create()
+            Renumber.execute(session_id, {
+                    'start': {
+                        'fiscalyear': fiscalyear.id,
+                        'first_number': 1,
+                        'first_move': None,
+                        'last_1_move': None,
+                        'last_2_move': None,
+                        'last_3_move': None,
+                        },
+                    }, 'renumber')
+            self.assertFalse(cached())
+
+    @with_transaction()
+    def test_general_journal_export(self):
+        "Test CSV and JSON Lines export of general journal"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Export = pool.get(
+            'account.summary.move.general_journal_export', type='report')
+
+        self.company = create_company()
+        with set_company(self.company):
+            fiscalyear, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+            moves = SummaryMove.search(
+                [('summary', '=', summary.id)], order=[('id', 'ASC')])
+            lines = [l for m in moves for l in m.lines]
+
+            data = {'fiscalyear': fiscalyear.id}
+            oext, content, _, _ = Export.execute([], data)
+            self.assertEqual(oext, 'csv')
+            rows = list(csv.reader(io.StringIO(content.decode('utf-8'))))
+            self.assertEqual(rows[0], Export._columns)
+            self.assertEqual(len(rows), len(lines) + 1)
+            self.assertEqual(rows[1][0], '1')
+            self.assertEqual(
+                sum(Decimal(r[7]) for r in rows[1:]),
+                sum(l.debit for l in lines))
+
+            # The content is the same when written to a temporary file
+            with patch.object(Export, '_spool_size', 1):
+                self.assertEqual(Export.execute([], data)[1], content)
+
+            data['format'] = 'jsonl'
+            oext, content, _, _ = Export.execute([moves[0].id], data)
+            self.assertEqual(oext, 'jsonl')
+            rows = map(json.loads, content.decode('utf-8').splitlines())
+            self.assertEqual(
+                [(r['account_name'], Decimal(r['debit']), Decimal(r['credit']))
+                    for r in rows],
+                [(l.account.name, l.debit, l.credit)
+                    for l in moves[0].lines])
+
+    @with_transaction()
+    def test_runs(self):
+        "Test metrics of compute and post runs"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+
+            post, compute = summary.runs
+            self.assertEqual(compute.operation, 'compute')
+            self.assertEqual(
+                (compute.moves, compute.lines, compute.summary_moves,
+                    compute.summary_lines),
+                (8, 16, 5, 10))
+            self.assertGreater(compute.queries, 0)
+            self.assertGreaterEqual(compute.duration, 0)
+            self.assertEqual(post.operation, 'post')
+            self.assertEqual(post.summary_moves, 5)
+            self.assertGreater(post.queries, 0)
+
+    @with_transaction()
+    def test_draft_post(self):
+        "Test draft and post summary"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Move = pool.get('account.move')
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+
+            Summary.draft([summary])
+            self.assertFalse(SummaryMove.search([]))
+            self.assertFalse(Move.search([('summary_move', '!=', None)]))
+
+            Summary.compute([summary])
+            other = self._compute('purchases_and_sales', period)
+            Summary.refresh([summary])
+            self.assertEqual(len(SummaryMove.search([])), 5)
+            Summary.draft([summary, other])
+            self.assertEqual(
+                {s.state for s in [summary, other]}, {'draft'})
+            self.assertFalse(SummaryMove.search([]))
+            self.assertFalse(Move.search([('summary_move', '!=', None)]))
+
+            Summary.compute([summary])
+            Summary.post([summary])
+            moves = SummaryMove.search([('summary', '=', summary.id)])
+            self.assertEqual({m.state for m in moves}, {'posted'})
+            self.assertEqual(
+                sorted(int(m.post_number) for m in moves), [1, 2, 3, 4, 5])
+            moves.sort(key=lambda m: m.id)
+            self.assertEqual(
+                [int(m.post_number) for m in moves], [1, 2, 3, 4, 5])
+            self.assertEqual({m.post_date for m in moves}, {period.end_date})
+
+    @with_transaction()
+    def test_post_queue(self):
+        "Test post summary by batch with queue tasks"
+        pool = Pool()
+        Summary = pool.get('account.summary')
+        SummaryMove = pool.get('account.summary.move')
+        Queue = pool.get('ir.queue')
+        if not config.has_section('account_move_summary'):
+            config.add_section('account_move_summary')
+        config.set('account_move_summary', 'post_queue', 'True')
+        config.set('account_move_summary', 'post_chunk', '2')
+        self.addCleanup(
+            config.remove_option, 'account_move_summary', 'post_queue')
+        self.addCleanup(
+            config.remove_option, 'account_move_summary', 'post_chunk')
+        transaction = Transaction()
+
+        self.company = create_company()
+        with set_company(self.company):
+            _, period = self._create_ledger()
+            summary = self._compute('all_moves', period)
+            Summary.post([summary])
+
+            self.assertEqual(summary.state, 'posting')
+            self.assertEqual(
+                (summary.tasks, summary.tasks_done, summary.moves_done),
+                (3, 0, 0))
+            self.assertEqual(
+                {m.state for m in SummaryMove.search([])}, {'draft'})
+            Queue(transaction.tasks.pop(0)).run()
+
+            summary = Summary(summary.id)
+            self.assertEqual(summary.state, 'posting')
+            self.assertEqual(
+                (summary.tasks_done, summary.moves_done), (1, 2))
+            self.assertEqual(
+                SummaryMove.search([('state', '=', 'posted')], count=True), 2)
+            while transaction.tasks:
+                Queue(transaction.tasks.pop(0)).run()
+
+            summary = Summary(summary.id)
+            self.assertEqual(summary.state, 'posted')
+            self.assertEqual(
+                (summary.tasks_done, summary.moves_done), (3, 5))
+            moves = SummaryMove.search(
+                [], order=[('date', 'ASC'), ('id', 'ASC')])
+            self.assertEqual({m.state for m in moves}, {'posted'})
+            self.assertEqual(
+                [m.post_number for m in moves], ['1', '2', '3', '4', '5'])
+
 
 del ModuleTestCase